@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from vat_startup_profile import check_profile, compare_to_baseline, load_snapshot, profile_startup
+
+# 서버 콜드 스타트 예산 (ms). 배포 환경에 맞게 VAT_STARTUP_BUDGET_MS로 조정
+BUDGET_MS = float(os.environ.get("VAT_STARTUP_BUDGET_MS", 3000))
+
+# 기준 스냅샷: python vat_startup_profile.py --repeat 5 --snapshot startup_profile_baseline.json
+BASELINE_FILE = os.environ.get(
+    "VAT_STARTUP_BASELINE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_profile_baseline.json")
+)
+
+@pytest.fixture(scope="module")
+def startup_profile():
+    pytest.importorskip("fastapi")  # 서버 의존성이 없는 환경에서는 측정 불가
+    return profile_startup(repeat=3, workdir=os.path.dirname(os.path.abspath(__file__)))
+
+def test_no_heavy_imports_at_startup(startup_profile):
+    # 시간과 무관한 검사: torch/sentence_transformers 등은 첫 검색(또는 백그라운드 예열) 때만 import
+    assert startup_profile["heavy_modules_at_startup"] == []
+
+def test_cold_start_within_budget(startup_profile):
+    assert check_profile(startup_profile, BUDGET_MS) == []
+
+def test_no_regression_against_baseline(startup_profile):
+    if not os.path.exists(BASELINE_FILE):
+        pytest.skip(f"기준 스냅샷 없음: {BASELINE_FILE}")
+    assert compare_to_baseline(startup_profile, load_snapshot(BASELINE_FILE)) == []
+
+def test_check_profile_flags_budget_and_heavy_imports():
+    profile = {"phases": [], "cold_start_ms": 120.0, "heavy_modules_at_startup": ["torch"]}
+    assert len(check_profile(profile, 100.0)) == 2
+    assert check_profile(dict(profile, heavy_modules_at_startup=[]), 200.0) == []
+
+def test_compare_to_baseline_flags_slower_phases():
+    baseline = {"phases": [{"phase": "import_vat_rag_service", "median_ms": 200.0}], "cold_start_ms": 300.0}
+    faster = {"phases": [{"phase": "import_vat_rag_service", "median_ms": 210.0}], "cold_start_ms": 310.0}
+    slower = {"phases": [{"phase": "import_vat_rag_service", "median_ms": 400.0}], "cold_start_ms": 600.0}
+    assert compare_to_baseline(faster, baseline) == []
+    assert len(compare_to_baseline(slower, baseline)) == 2
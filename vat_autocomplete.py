@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+# 조문 내용에서 정의된 용어 추출: "재화"란, (이하 "세금계산서"라 한다) 등
+_QUOTED_TERM_PATTERN = re.compile(r'["“]([^"”]{1,20})["”]')
+
+# 이 길이 이하의 접두어는 후보 구간이 넓으므로 인덱스 생성 시 순위를 미리 계산해 둔다
+_PRECOMPUTED_PREFIX_LENGTH = 2
+# 미리 계산해 두는 후보 수 (서버의 limit 상한과 같음)
+_PRECOMPUTED_LIMIT = 20
+
+def normalize_term(text: str) -> str:
+    """자동완성 키 정규화 (공백 제거, 소문자)"""
+    return re.sub(r'\s+', '', text).lower()
+
+def get_autocomplete_file(data_file: str) -> str:
+    """전처리 데이터 파일에 대응하는 자동완성 인덱스 파일 경로"""
+    base, _ = os.path.splitext(data_file)
+    return f"{base}.autocomplete.pkl"
+
+class AutocompleteIndex:
+    def __init__(self, entries: List[Tuple[str, int, str, str, str]]):
+        """정렬 배열 기반 접두어 검색 인덱스
+
+        entries는 (정규화 키, 가중치, 표시 문자열, 종류, 조문 번호) 목록이며 키 순으로 정렬해 둔다.
+        조회는 이진 탐색 + 연속 구간 스캔이라 모델 추론 없이 키 입력마다 호출할 수 있다.
+        """
+        self.entries = sorted(entries, key=lambda entry: (entry[0], -entry[1]))
+        self.keys = [entry[0] for entry in self.entries]
+        self._precomputed = self._precompute_short_prefixes()
+
+    def _precompute_short_prefixes(self) -> Dict[str, List[Dict[str, str]]]:
+        """짧은 접두어(1~2글자)별 상위 후보 미리 계산 (조회 시 넓은 구간 정렬을 피함)"""
+        prefixes = set()
+        for key in self.keys:
+            for length in range(1, min(len(key), _PRECOMPUTED_PREFIX_LENGTH) + 1):
+                prefixes.add(key[:length])
+        return {prefix: self._rank(prefix, _PRECOMPUTED_LIMIT) for prefix in prefixes}
+
+    def _rank(self, key: str, limit: int) -> List[Dict[str, str]]:
+        """키로 시작하는 모든 후보를 순위대로 정렬해 상위 limit개 반환"""
+        start = bisect_left(self.keys, key)
+        end = bisect_right(self.keys, key + '\uffff', start)
+        candidates = self.entries[start:end]
+
+        # 정확히 일치하는 키 우선, 그다음 가중치, 짧은 키 순
+        candidates.sort(key=lambda entry: (entry[0] != key, -entry[1], len(entry[0])))
+
+        suggestions = []
+        seen = set()
+        for _, _, display, kind, article_number in candidates:
+            if display in seen:
+                continue
+            seen.add(display)
+            suggestions.append({'text': display, 'type': kind, 'article_number': article_number})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    @classmethod
+    def build(cls, processed_data: List[Dict[str, Any]]) -> "AutocompleteIndex":
+        """전처리된 청크 데이터로 자동완성 인덱스 생성"""
+        articles = {}
+        for chunk in processed_data:
+            articles.setdefault((chunk['law_name'], chunk['article_number']), chunk)
+
+        term_counts = Counter()
+        term_articles = {}
+        entries = []
+        for (law_name, article_number), chunk in articles.items():
+            title = chunk['article_title']
+            display = f"{article_number} {title}"
+
+            # 조문 번호: "제30조", "30조"
+            entries.append((normalize_term(article_number), 3, display, 'article', article_number))
+            entries.append((normalize_term(article_number.lstrip('제')), 3, display, 'article', article_number))
+
+            # 조문 제목: 어절 시작 위치마다 키 생성 ("세금계산서 등" → "세금계산서등", "등")
+            words = title.split()
+            for start in range(len(words)):
+                entries.append((normalize_term(''.join(words[start:])), 2, display, 'title', article_number))
+
+            # 법률 용어: 따옴표로 정의된 용어
+            for term in _QUOTED_TERM_PATTERN.findall(chunk['full_content']):
+                term_counts[term] += 1
+                term_articles.setdefault(term, article_number)
+
+        for term, count in term_counts.items():
+            entries.append((normalize_term(term), 1 + count, term, 'term', term_articles[term]))
+
+        return cls([entry for entry in entries if entry[0]])
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        """접두어로 시작하는 자동완성 후보 (가중치 순)"""
+        key = normalize_term(prefix)
+        if not key:
+            return []
+
+        if len(key) <= _PRECOMPUTED_PREFIX_LENGTH and limit <= _PRECOMPUTED_LIMIT:
+            return [dict(suggestion) for suggestion in self._precomputed.get(key, [])[:limit]]
+        return self._rank(key, limit)
+
+    def save(self, output_file: str) -> None:
+        """자동완성 인덱스 저장"""
+        with open(output_file, 'wb') as f:
+            pickle.dump(self.entries, f)
+
+    @classmethod
+    def load(cls, input_file: str) -> "AutocompleteIndex":
+        """자동완성 인덱스 로드"""
+        with open(input_file, 'rb') as f:
+            return cls(pickle.load(f))
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from vat_preprocessor import VATLawProcessor, read_document_text
+from vat_sharded_search import save_shards
+from vat_projection import project_processed_data
+
+# 코퍼스로 읽을 문서 확장자
+DOCUMENT_EXTENSIONS = ('.docx', '.txt', '.md')
+
+# 워커 프로세스별 전처리기 (토크나이저만 사용, 모델은 올리지 않음)
+_worker_processor: Optional[VATLawProcessor] = None
+# 개정 전/후 조문 중 시행 중인 판을 고르는 기준일 (모든 워커가 같은 날짜 사용)
+_worker_as_of: Optional[datetime.date] = None
+
+def _make_id_part(name: str) -> str:
+    """파일명/조문 번호를 청크 id 구성 요소로 정규화 ("부칙(제20614호) 제2조" → "부칙_제20614호_제2조")"""
+    return re.sub(r'[^0-9A-Za-z가-힣]+', '_', name).strip('_') or 'doc'
+
+def discover_documents(input_path: str) -> List[Dict[str, str]]:
+    """디렉터리 또는 매니페스트(JSON)에서 문서 목록 생성
+
+    매니페스트 형식: {"documents": [{"path": "부가가치세법.docx", "law_name": "부가가치세법", "id": "vat_act"}]}
+    path는 매니페스트 파일 기준 상대 경로이며 law_name/id는 생략하면 파일명으로 정한다.
+    문서는 id 순으로 정렬하므로 입력 순서와 관계없이 같은 코퍼스는 같은 청크 id를 얻는다.
+    """
+    documents = []
+    if os.path.isdir(input_path):
+        for name in os.listdir(input_path):
+            if name.lower().endswith(DOCUMENT_EXTENSIONS) and not name.startswith('~$'):
+                documents.append({'path': name})
+        base_dir = input_path
+    else:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(input_path))
+        documents = [dict(document) for document in manifest['documents']]
+
+    for document in documents:
+        if not os.path.isabs(document['path']):
+            document['path'] = os.path.join(base_dir, document['path'])
+        stem = os.path.splitext(os.path.basename(document['path']))[0]
+        document.setdefault('law_name', stem)
+        document.setdefault('id', _make_id_part(stem))
+
+    document_ids = [document['id'] for document in documents]
+    duplicates = sorted({doc_id for doc_id in document_ids if document_ids.count(doc_id) > 1})
+    if duplicates:
+        raise ValueError(f"중복된 문서 id: {', '.join(duplicates)}")
+
+    return sorted(documents, key=lambda document: document['id'])
+
+def _init_worker(model_name: str, model_revision: Optional[str], max_chunk_tokens: int,
+                 chunk_overlap_tokens: int, as_of: datetime.date) -> None:
+    global _worker_processor, _worker_as_of
+    _worker_as_of = as_of
+    _worker_processor = VATLawProcessor(model_name, max_chunk_tokens=max_chunk_tokens,
+                                        chunk_overlap_tokens=chunk_overlap_tokens,
+                                        model_revision=model_revision, cache_file=None, load_model=False)
+
+def _parse_and_chunk(document: Dict[str, str]) -> Dict[str, Any]:
+    """문서 하나를 파싱하고 조문별로 청킹 (워커 프로세스에서 실행)"""
+    started = time.perf_counter()
+    text = read_document_text(document['path'])
+    articles = _worker_processor.extract_articles_from_docx(text, law_name=document['law_name'], as_of=_worker_as_of)
+    for article in articles:
+        article['chunks'] = _worker_processor.chunk_article_content(article['content'])
+    return {
+        'document': document,
+        'articles': articles,
+        'seconds': time.perf_counter() - started
+    }
+
+def build_corpus(input_path: str, output_file: str = "vat_law_processed.pkl",
+                 model_name: str = "jhgan/ko-sbert-nli", model_revision: Optional[str] = None,
+                 parse_workers: Optional[int] = None, encoder_workers: int = 1, batch_size: int = 32,
+                 chunk_overlap_tokens: int = 0, cache_file: Optional[str] = "vat_embedding_cache.db",
+                 num_shards: int = 0, projection_dim: int = 0,
+                 as_of: Optional[datetime.date] = None) -> Dict[str, Any]:
+    """여러 법령 문서를 병렬로 파싱/청킹/임베딩해 하나의 인덱스로 저장하고 단계별 처리량 반환
+
+    as_of는 개정 전/후 조문 중 시행 중인 판을 고르는 기준일이다 (기본: 오늘). 같은 문서와 같은 기준일이면
+    빌드 날짜와 관계없이 같은 인덱스가 나오며, 사용한 기준일은 빌드 통계에 기록된다.
+    """
+    stage_report = {}
+    as_of = as_of or datetime.date.today()
+
+    documents = discover_documents(input_path)
+    if not documents:
+        print(f"처리할 문서가 없습니다: {input_path}")
+        return {}
+    print(f"문서 {len(documents)}개 발견")
+
+    processor = VATLawProcessor(model_name, chunk_overlap_tokens=chunk_overlap_tokens,
+                                model_revision=model_revision, cache_file=cache_file)
+    max_chunk_tokens = processor.get_max_chunk_tokens()
+
+    # 1단계: 파싱 + 청킹 (프로세스 풀, 결과는 문서 id 순서 유지)
+    started = time.perf_counter()
+    workers = parse_workers or os.cpu_count() or 1
+    # 부모 프로세스가 모델(torch)을 올릴 수 있으므로 fork 대신 spawn 사용
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker,
+                             initargs=(model_name, model_revision, max_chunk_tokens, chunk_overlap_tokens,
+                                       as_of)) as executor:
+        parsed_documents = list(executor.map(_parse_and_chunk, documents))
+    parse_seconds = time.perf_counter() - started
+
+    records = []
+    for parsed in parsed_documents:
+        document = parsed['document']
+        chunk_count = sum(len(article['chunks']) for article in parsed['articles'])
+        print(f"  {document['law_name']}: {len(parsed['articles'])}개 조문, {chunk_count}개 청크 ({parsed['seconds']:.2f}초)")
+        for article in parsed['articles']:
+            for chunk_idx, chunk in enumerate(article['chunks']):
+                records.append((document['id'], chunk_idx, article, chunk))
+
+    article_count = sum(len(parsed['articles']) for parsed in parsed_documents)
+    stage_report['parse_chunk'] = {
+        'seconds': round(parse_seconds, 2),
+        'workers': workers,
+        'documents_per_second': round(len(documents) / parse_seconds, 2) if parse_seconds > 0 else 0.0,
+        'chunks_per_second': round(len(records) / parse_seconds, 1) if parse_seconds > 0 else 0.0
+    }
+    if not records:
+        print("추출된 조문이 없습니다. 문서 형식을 확인해주세요.")
+        return {'stages': stage_report}
+
+    # 2단계: 임베딩 (캐시 적중분 제외, encoder_workers개 인코더 프로세스)
+    started = time.perf_counter()
+    embeddings = processor.encode_texts([record[3] for record in records], batch_size=batch_size,
+                                        encoder_workers=encoder_workers)
+    embed_seconds = time.perf_counter() - started
+    stage_report['embed'] = {
+        'seconds': round(embed_seconds, 2),
+        'encoder_workers': encoder_workers,
+        'chunks_per_second': round(len(records) / embed_seconds, 1) if embed_seconds > 0 else 0.0
+    }
+
+    # 3단계: 병합 + 저장 (청크 id = 문서 id + 조문 번호 + 청크 순번, 조문을 추가/삭제해도 다른 조문 id는 유지)
+    started = time.perf_counter()
+    processed_data = []
+    for (document_id, chunk_idx, article, chunk), embedding in zip(records, embeddings):
+        processed_data.append({
+            'id': f"{document_id}_{_make_id_part(article['article_number'])}_{chunk_idx}",
+            'law_name': article['law_name'],
+            'article_number': article['article_number'],
+            'article_title': article['title'],
+            'full_content': article['content'],
+            'chunk_content': chunk,
+            'chunk_index': chunk_idx,
+            'embedding': embedding.tolist(),
+            'embedding_dim': len(embedding)
+        })
+    projection = None
+    if projection_dim > 0:
+        projection = project_processed_data(processed_data, projection_dim, model_name)
+        print(f"차원 축소: {projection.input_dim} → {projection.output_dim} (설명 분산 {projection.explained_variance_ratio:.1%})")
+    processor.save_processed_data(processed_data, output_file, projection)
+    if num_shards > 0:
+        save_shards(processed_data, output_file, num_shards)
+    save_seconds = time.perf_counter() - started
+    stage_report['merge_save'] = {
+        'seconds': round(save_seconds, 2),
+        'chunks_per_second': round(len(processed_data) / save_seconds, 1) if save_seconds > 0 else 0.0
+    }
+
+    return {
+        'documents': len(documents),
+        'articles': article_count,
+        'chunks': len(processed_data),
+        'embedding_dim': processed_data[0]['embedding_dim'],
+        'output_file': output_file,
+        'as_of': as_of.isoformat(),
+        'stages': stage_report
+    }
+
+def main():
+    """여러 법령 문서로 통합 인덱스 생성"""
+    parser = argparse.ArgumentParser(description="법령 코퍼스 병렬 빌드")
+    parser.add_argument("input", help="문서 디렉터리 또는 매니페스트 JSON 파일")
+    parser.add_argument("--output", default="vat_law_processed.pkl", help="저장 파일")
+    parser.add_argument("--model", default="jhgan/ko-sbert-nli", help="임베딩 모델")
+    parser.add_argument("--model-revision", default=None, help="임베딩 모델 리비전")
+    parser.add_argument("--parse-workers", type=int, default=None, help="파싱/청킹 프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--encoder-workers", type=int, default=1, help="임베딩 인코더 프로세스 수")
+    parser.add_argument("--batch-size", type=int, default=32, help="인코딩 배치 크기")
+    parser.add_argument("--chunk-overlap", type=int, default=0, help="청크 간 겹침 토큰 수")
+    parser.add_argument("--no-cache", action="store_true", help="임베딩 캐시 사용 안 함")
+    parser.add_argument("--shards", type=int, default=0, help="샤드 분산 검색용 샤드 수 (0이면 나누지 않음)")
+    parser.add_argument("--projection-dim", type=int, default=0, help="임베딩 축소 차원 (0이면 축소하지 않음)")
+    parser.add_argument("--as-of", type=datetime.date.fromisoformat, default=None,
+                        help="시행 중인 조문 판을 고르는 기준일 YYYY-MM-DD (기본: 오늘)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("법령 코퍼스 병렬 빌드")
+    print("=" * 60)
+
+    report = build_corpus(
+        args.input,
+        output_file=args.output,
+        model_name=args.model,
+        model_revision=args.model_revision,
+        parse_workers=args.parse_workers,
+        encoder_workers=args.encoder_workers,
+        batch_size=args.batch_size,
+        chunk_overlap_tokens=args.chunk_overlap,
+        cache_file=None if args.no_cache else "vat_embedding_cache.db",
+        num_shards=args.shards,
+        projection_dim=args.projection_dim,
+        as_of=args.as_of
+    )
+
+    if report:
+        print("\n" + "=" * 60)
+        print("빌드 통계:")
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import List, Optional, Sequence
+
+# SQLite 한 번의 쿼리에 넣을 최대 파라미터 수 (기본 한도 999 미만으로 유지)
+_SQL_BATCH_SIZE = 500
+
+class EmbeddingCache:
+    def __init__(self, cache_file: str = "vat_embedding_cache.db", max_size_mb: float = 1024):
+        """디스크 기반 임베딩 캐시 초기화
+
+        (모델명, 모델 리비전, 텍스트 해시)를 키로 임베딩을 저장한다.
+        리비전은 커밋 해시처럼 스냅샷을 고정하는 값이어야 한다 (모델이 갱신되면 다른 키가 되도록).
+        SQLite WAL 모드를 사용하므로 여러 빌드 프로세스가 같은 파일을 동시에 써도 안전하다.
+        """
+        self.cache_file = cache_file
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_file, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                model_revision TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model_name, model_revision, text_hash)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        # 캐시 용량은 열 때 한 번만 합산하고 이후에는 저장/삭제마다 갱신
+        self._total_bytes = self._sum_bytes()
+
+    def _sum_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """캐시 키로 쓰는 텍스트 해시"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _require_revision(model_revision: Optional[str]) -> str:
+        """리비전 없이 저장하면 모델이 갱신돼도 이전 임베딩이 반환되므로 거부"""
+        if not model_revision:
+            raise ValueError("임베딩 캐시에는 모델 스냅샷 리비전(커밋 해시)이 필요합니다")
+        return model_revision
+
+    def get_many(self, model_name: str, model_revision: Optional[str], texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """텍스트 목록의 임베딩 일괄 조회 (없으면 None)"""
+        revision = self._require_revision(model_revision)
+        hashes = [self.text_hash(text) for text in texts]
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(hashes), _SQL_BATCH_SIZE):
+                batch = list(set(hashes[start:start + _SQL_BATCH_SIZE]))
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model_name = ? AND model_revision = ? AND text_hash IN ({placeholders})",
+                    [model_name, revision, *batch]
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32)
+
+            # LRU 정리를 위한 최근 접근 시각 갱신
+            if found:
+                now = time.time()
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? "
+                        "WHERE model_name = ? AND model_revision = ? AND text_hash = ?",
+                        [(now, model_name, revision, text_hash) for text_hash in found]
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+        results = [found.get(text_hash) for text_hash in hashes]
+        hit_count = sum(1 for result in results if result is not None)
+        self.hits += hit_count
+        self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model_name: str, model_revision: Optional[str], texts: Sequence[str], embeddings) -> None:
+        """텍스트 목록의 임베딩 일괄 저장"""
+        if len(texts) == 0:
+            return
+
+        revision = self._require_revision(model_revision)
+        now = time.time()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            vector = np.asarray(embedding, dtype=np.float32).tobytes()
+            rows.append((model_name, revision, self.text_hash(text), len(embedding), vector, len(vector), now))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 같은 키가 이미 있으면 (다른 빌드 프로세스가 먼저 저장) 같은 벡터이므로 건너뜀
+                inserted_bytes = 0
+                for row in rows:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO embeddings "
+                        "(model_name, model_revision, text_hash, dim, vector, nbytes, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        row
+                    )
+                    if cursor.rowcount > 0:
+                        inserted_bytes += row[5]
+                freed_bytes = self._evict_locked(self._total_bytes + inserted_bytes, batch_time=now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._total_bytes += inserted_bytes - freed_bytes
+
+    def _evict_locked(self, total_bytes: int, batch_time: float) -> int:
+        """용량 초과 시 오래 사용하지 않은 항목부터 삭제 (전체 용량의 90%까지), 삭제한 바이트 수 반환
+
+        방금 저장한 배치(last_access == batch_time)는 삭제 대상에서 제외한다.
+        """
+        if total_bytes <= self.max_size_bytes:
+            return 0
+
+        # 다른 프로세스가 같은 파일에 쓴 양은 누적값에 없으므로 정리할 때만 실제 합계로 보정
+        actual_bytes = self._sum_bytes()
+        self._total_bytes += actual_bytes - total_bytes
+        if actual_bytes <= self.max_size_bytes:
+            return 0
+
+        target_bytes = int(self.max_size_bytes * 0.9)
+        to_free = actual_bytes - target_bytes
+        freed = 0
+        stale_rowids = []
+        for rowid, nbytes in self._conn.execute(
+            "SELECT rowid, nbytes FROM embeddings WHERE last_access < ? ORDER BY last_access ASC", (batch_time,)
+        ):
+            stale_rowids.append((rowid,))
+            freed += nbytes
+            if freed >= to_free:
+                break
+
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", stale_rowids)
+        print(f"임베딩 캐시 정리: {len(stale_rowids)}개 항목 삭제 ({freed / 1024 / 1024:.1f}MB)")
+        return freed
+
+    def get_statistics(self):
+        """임베딩 캐시 통계"""
+        with self._lock:
+            entry_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total_bytes = self._total_bytes
+        return {
+            "cache_file": self.cache_file,
+            "entries": entry_count,
+            "size_mb": round(total_bytes / 1024 / 1024, 2),
+            "max_size_mb": round(self.max_size_bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def close(self) -> None:
+        """캐시 연결 종료"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+class QueueFullError(Exception):
+    """추론 대기열이 가득 차서 요청을 받을 수 없음"""
+
+class DeadlineExceededError(Exception):
+    """요청 마감 시간 내에 추론을 마치지 못함"""
+
+class InferenceExecutor:
+    def __init__(self, max_workers: Optional[int] = None, torch_threads: Optional[int] = None,
+                 max_queue_size: Optional[int] = None, default_deadline_ms: Optional[float] = None):
+        """모델 추론 전용 실행기 초기화
+
+        동시에 모델을 호출하는 스레드 수를 max_workers로 제한하고,
+        대기 중인 요청이 max_queue_size를 넘으면 즉시 QueueFullError로 거절한다.
+        설정하지 않은 값은 환경변수(VAT_INFERENCE_WORKERS, VAT_TORCH_THREADS,
+        VAT_INFERENCE_QUEUE_SIZE, VAT_REQUEST_DEADLINE_MS)에서 읽는다.
+        """
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = max_workers or int(os.environ.get("VAT_INFERENCE_WORKERS", 2))
+        self.torch_threads = torch_threads or int(
+            os.environ.get("VAT_TORCH_THREADS", max(1, cpu_count // self.max_workers))
+        )
+        self.max_queue_size = max_queue_size if max_queue_size is not None else int(
+            os.environ.get("VAT_INFERENCE_QUEUE_SIZE", 32)
+        )
+        self.default_deadline_ms = default_deadline_ms or float(os.environ.get("VAT_REQUEST_DEADLINE_MS", 10000))
+
+        # 실행 중 + 대기 중 요청 수의 상한
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue_size)
+        # torch 스레드 설정은 첫 추론 요청 때 (서버 시작 시 torch를 import하지 않도록)
+        self._torch_configured = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="vat-inference",
+                                            initializer=self._configure_torch_threads)
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "expired": 0}
+        self._in_flight = 0
+
+    def _configure_torch_threads(self) -> None:
+        """torch intra-op 스레드 수 제한 (워커 수 x 스레드 수가 코어 수를 넘지 않도록)"""
+        if self._torch_configured:
+            return
+        self._torch_configured = True
+        try:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+            print(f"⚙️ 추론 실행기: 워커 {self.max_workers}개, torch 스레드 {self.torch_threads}개, 대기열 {self.max_queue_size}개")
+        except ImportError:
+            print("⚠️ torch를 찾을 수 없어 스레드 수를 설정하지 않습니다")
+
+    def _count(self, key: str, delta: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    def _run_task(self, deadline: float, fn: Callable, args, kwargs):
+        # 대기열에서 마감 시간이 지난 요청은 실행하지 않고 버린다
+        if time.monotonic() >= deadline:
+            raise DeadlineExceededError("대기열에서 마감 시간 초과")
+        return fn(*args, **kwargs)
+
+    def _count_outcome(self, outcome: Dict[str, bool], key: str) -> None:
+        """요청 하나의 결과는 한 번만 집계 (마감 초과 후 늦게 끝난 작업을 completed로 다시 세지 않음)"""
+        with self._stats_lock:
+            if not outcome["counted"]:
+                outcome["counted"] = True
+                self._stats[key] += 1
+
+    def _release_slot(self, future, outcome: Dict[str, bool]) -> None:
+        with self._stats_lock:
+            self._in_flight -= 1
+        if not future.cancelled():
+            error = future.exception()
+            if error is None:
+                self._count_outcome(outcome, "completed")
+            elif isinstance(error, DeadlineExceededError):
+                self._count_outcome(outcome, "expired")
+            else:
+                self._count_outcome(outcome, "failed")
+        self._slots.release()
+
+    def run(self, fn: Callable, *args, deadline_ms: Optional[float] = None, **kwargs) -> Any:
+        """추론 함수를 실행기에서 실행하고 결과 반환
+
+        Raises:
+            QueueFullError: 대기열이 가득 찬 경우 (즉시 반환)
+            DeadlineExceededError: 마감 시간 내에 끝나지 않은 경우
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise QueueFullError(f"추론 대기열이 가득 찼습니다 (최대 {self.max_workers + self.max_queue_size}개)")
+
+        timeout = (deadline_ms or self.default_deadline_ms) / 1000
+        deadline = time.monotonic() + timeout
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+            self._in_flight += 1
+
+        try:
+            future = self._executor.submit(self._run_task, deadline, fn, args, kwargs)
+        except Exception:
+            with self._stats_lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise
+        outcome = {"counted": False}
+        future.add_done_callback(lambda done_future: self._release_slot(done_future, outcome))
+
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            # 아직 시작하지 않은 작업은 취소, 실행 중인 작업은 끝나면 슬롯 반환
+            future.cancel()
+            self._count_outcome(outcome, "expired")
+            raise DeadlineExceededError(f"요청 마감 시간 초과 ({timeout * 1000:.0f}ms)")
+        except DeadlineExceededError:
+            self._count_outcome(outcome, "expired")
+            raise
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """실행기 통계"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = self._in_flight
+        stats.update({
+            "max_workers": self.max_workers,
+            "torch_threads": self.torch_threads,
+            "max_queue_size": self.max_queue_size,
+            "default_deadline_ms": self.default_deadline_ms
+        })
+        return stats
+
+    def shutdown(self) -> None:
+        """실행기 종료"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -3,22 +3,39 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 from typing import Optional
+import argparse
+import multiprocessing
+import os
+import threading
+import time
 import traceback
+from vat_inference_executor import InferenceExecutor, QueueFullError, DeadlineExceededError
+from vat_query_log import QueryLogger, get_top_queries
+from vat_model_registry import get_model_registry
 
 # vat_rag_service 모듈 import (정확한 파일명 사용)
 try:
-    from vat_rag_service import search_vat_law, get_vat_search_statistics, find_related_articles
+    from vat_rag_service import search_vat_law, get_vat_search_statistics, find_related_articles, get_autocomplete_suggestions
+    from vat_rag_service import warm_up_model, get_model_status, initialize_vat_search_engine
     print("✅ 부가가치세법 RAG 모듈 로딩 성공")
 except Exception as import_error:
     print(f"❌ 부가가치세법 RAG 모듈 로딩 실패: {import_error}")
     print(f"❌ 상세 오류:\n{traceback.format_exc()}")
     
-    def search_vat_law(keyword, top_k=5):
+    def search_vat_law(keyword, top_k=5, runner=None, deadline_ms=None, use_cache=True):
         return {"error": "RAG 모듈을 불러올 수 없습니다", "message": str(import_error)}
     def get_vat_search_statistics():
         return {"error": "RAG 모듈을 불러올 수 없습니다"}
-    def find_related_articles(article_number, top_k=3):
+    def find_related_articles(article_number, top_k=3, runner=None):
         return {"error": "RAG 모듈을 불러올 수 없습니다"}
+    def get_autocomplete_suggestions(prefix, limit=10):
+        return {"error": "RAG 모듈을 불러올 수 없습니다"}
+    def warm_up_model():
+        return False
+    def get_model_status():
+        return "unavailable"
+    def initialize_vat_search_engine():
+        return False
 
 app = FastAPI(
     title="부가가치세법 RAG 검색 시스템",
@@ -35,6 +52,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 🧵 모델 추론 전용 실행기 (동시 추론 수 제한 + 대기열 초과 시 즉시 거절)
+# 동일 검색어 요청은 vat_rag_service에서 병합되어 대표 요청 하나만 실행기를 사용한다
+inference_executor = InferenceExecutor()
+
+# 📝 검색 로그 / 캐시 예열 설정 (VAT_QUERY_LOG를 빈 문자열로 두면 로그 비활성화)
+QUERY_LOG_FILE = os.environ.get("VAT_QUERY_LOG", "vat_query_log.jsonl")
+PREWARM_TOP_N = int(os.environ.get("VAT_PREWARM_TOP_N", 0))
+
+# 🧠 서버 시작 직후 백그라운드에서 모델 로딩 (VAT_MODEL_WARMUP=0이면 첫 검색 때 로딩)
+MODEL_WARMUP = os.environ.get("VAT_MODEL_WARMUP", "1") == "1"
+query_logger = None
+
+@app.on_event("startup")
+def on_startup():
+    """검색 엔진 초기화, 검색 로그 시작, 모델 백그라운드 로딩 및 자주 검색된 쿼리로 캐시 예열"""
+    global query_logger
+    
+    # 샤드 워커 같은 자식 프로세스에서는 검색 엔진을 만들지 않는다
+    if multiprocessing.parent_process() is None:
+        try:
+            initialize_vat_search_engine()
+        except Exception as init_error:
+            print(f"❌ 검색 엔진 초기화 중 오류: {init_error}")
+    
+    # 모델(torch) 로딩을 기다리지 않고 바로 요청을 받는다 (로딩 전 검색은 로딩 완료까지 대기)
+    if MODEL_WARMUP:
+        threading.Thread(target=warm_up_model, name="model-warmup", daemon=True).start()
+    
+    if QUERY_LOG_FILE:
+        query_logger = QueryLogger(QUERY_LOG_FILE)
+        print(f"📝 검색 로그: {QUERY_LOG_FILE}")
+    
+    if PREWARM_TOP_N > 0:
+        prewarm_caches(PREWARM_TOP_N)
+
+@app.on_event("shutdown")
+def on_shutdown():
+    """남은 검색 로그 기록 및 유휴 모델 언로딩 스레드 종료"""
+    if query_logger is not None:
+        query_logger.close()
+    get_model_registry().shutdown()
+
+def prewarm_caches(top_n: int):
+    """검색 로그에서 가장 많이 검색된 쿼리로 임베딩/결과 캐시 예열"""
+    if not QUERY_LOG_FILE or not os.path.exists(QUERY_LOG_FILE):
+        print("⚠️ 검색 로그가 없어 캐시 예열을 건너뜁니다")
+        return
+    
+    try:
+        top_queries = get_top_queries(QUERY_LOG_FILE, top_n)
+        print(f"🔥 캐시 예열 중: 상위 {len(top_queries)}개 쿼리")
+        started = time.perf_counter()
+        for query, max_results, _ in top_queries:
+            search_vat_law(query, top_k=max_results)
+        print(f"✅ 캐시 예열 완료: {len(top_queries)}개 쿼리 ({time.perf_counter() - started:.2f}초)")
+    except Exception as prewarm_error:
+        print(f"❌ 캐시 예열 오류: {prewarm_error}")
+
 class SearchRequest(BaseModel):
     keywords: str
     max_results: Optional[int] = 5
@@ -54,6 +129,7 @@ def home():
         "endpoints": {
             "search": "/search-law",
             "related": "/related-articles",
+            "autocomplete": "/autocomplete",
             "stats": "/statistics",
             "docs": "/docs"
         }
@@ -64,25 +140,61 @@ def get_statistics():
     """검색 엔진 통계 정보"""
     try:
         stats = get_vat_search_statistics()
-        return {"success": True, "statistics": stats}
+        return {
+            "success": True,
+            "statistics": stats,
+            "inference_executor": inference_executor.get_statistics(),
+            "query_log": query_logger.get_statistics() if query_logger is not None else None
+        }
     except Exception as stats_error:
         print(f"❌ 통계 조회 오류: {stats_error}")
         print(f"❌ 상세 오류:\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"통계 조회 실패: {str(stats_error)}")
 
+def _log_query(endpoint: str, outcome: dict, started: float):
+    """검색 로그 기록 (로그 비활성화 시 무시)"""
+    if query_logger is None:
+        return
+    query_logger.log(
+        endpoint,
+        outcome["query"],
+        outcome["params"],
+        (time.perf_counter() - started) * 1000,
+        outcome["cache_status"],
+        outcome["status"]
+    )
+
 @app.post("/search-law")
 def search_law(request: SearchRequest):
     """부가가치세법 조문 검색"""
+    started = time.perf_counter()
+    outcome = {"query": request.keywords, "params": {"max_results": request.max_results},
+               "cache_status": None, "status": 500}
+    try:
+        response = _search_law(request, outcome)
+        outcome["status"] = 200
+        return response
+    except HTTPException as http_error:
+        outcome["status"] = http_error.status_code
+        raise
+    finally:
+        _log_query("/search-law", outcome, started)
+
+def _search_law(request: SearchRequest, outcome: dict):
+    """부가가치세법 조문 검색 처리 (outcome에 로그용 결과 기록)"""
     try:
         keyword = request.keywords.strip()
         if not keyword:
             raise HTTPException(status_code=400, detail="검색 키워드를 입력해주세요")
         
         max_results = min(request.max_results, 20)  # 최대 20개로 제한
+        outcome["query"] = keyword
+        outcome["params"] = {"max_results": max_results}
         
         print(f"🔍 검색 요청: '{keyword}' (최대 {max_results}개)")
         
-        results = search_vat_law(keyword, top_k=max_results)
+        results = search_vat_law(keyword, top_k=max_results, runner=inference_executor.run)
+        outcome["cache_status"] = results.get("cache_status")
         
         if "error" in results:
             print(f"❌ 검색 중 오류: {results['error']}")
@@ -101,6 +213,14 @@ def search_law(request: SearchRequest):
         
     except HTTPException:
         raise
+    except QueueFullError as queue_error:
+        print(f"⚠️ 요청 거절 (대기열 초과): {queue_error}")
+        raise HTTPException(status_code=429, detail="요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요",
+                            headers={"Retry-After": "1"})
+    except DeadlineExceededError as deadline_error:
+        print(f"⚠️ 요청 시간 초과: {deadline_error}")
+        raise HTTPException(status_code=503, detail="요청 처리 시간이 초과되었습니다",
+                            headers={"Retry-After": "1"})
     except Exception as search_error:
         print(f"❌ 검색 API 오류: {search_error}")
         print(f"❌ 상세 오류:\n{traceback.format_exc()}")
@@ -109,16 +229,34 @@ def search_law(request: SearchRequest):
 @app.post("/related-articles")
 def get_related_articles(request: RelatedArticleRequest):
     """특정 조문과 관련된 다른 조문들 검색"""
+    started = time.perf_counter()
+    outcome = {"query": request.article_number, "params": {"max_results": request.max_results},
+               "cache_status": None, "status": 500}
+    try:
+        response = _get_related_articles(request, outcome)
+        outcome["status"] = 200
+        return response
+    except HTTPException as http_error:
+        outcome["status"] = http_error.status_code
+        raise
+    finally:
+        _log_query("/related-articles", outcome, started)
+
+def _get_related_articles(request: RelatedArticleRequest, outcome: dict):
+    """관련 조문 검색 처리 (outcome에 로그용 결과 기록)"""
     try:
         article_number = request.article_number.strip()
         if not article_number:
             raise HTTPException(status_code=400, detail="조문 번호를 입력해주세요")
         
         max_results = min(request.max_results, 10)
+        outcome["query"] = article_number
+        outcome["params"] = {"max_results": max_results}
         
         print(f"🔗 관련 조문 검색: '{article_number}' (최대 {max_results}개)")
         
-        results = find_related_articles(article_number, top_k=max_results)
+        results = find_related_articles(article_number, top_k=max_results, runner=inference_executor.run)
+        outcome["cache_status"] = results.get("cache_status")
         
         if "error" in results:
             print(f"❌ 관련 조문 검색 오류: {results['error']}")
@@ -133,17 +271,47 @@ def get_related_articles(request: RelatedArticleRequest):
         
     except HTTPException:
         raise
+    except QueueFullError as queue_error:
+        print(f"⚠️ 요청 거절 (대기열 초과): {queue_error}")
+        raise HTTPException(status_code=429, detail="요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요",
+                            headers={"Retry-After": "1"})
+    except DeadlineExceededError as deadline_error:
+        print(f"⚠️ 요청 시간 초과: {deadline_error}")
+        raise HTTPException(status_code=503, detail="요청 처리 시간이 초과되었습니다",
+                            headers={"Retry-After": "1"})
     except Exception as related_error:
         print(f"❌ 관련 조문 검색 API 오류: {related_error}")
         print(f"❌ 상세 오류:\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"관련 조문 검색 중 오류 발생: {str(related_error)}")
 
+@app.get("/autocomplete")
+def autocomplete(q: str, limit: int = 10):
+    """조문 번호/제목/법률 용어 자동완성 (키 입력마다 호출 가능, 모델 추론 없음)"""
+    prefix = q.strip()
+    if not prefix:
+        return {"success": True, "prefix": prefix, "suggestions": []}
+    
+    results = get_autocomplete_suggestions(prefix, limit=min(max(limit, 1), 20))
+    if "error" in results:
+        raise HTTPException(status_code=503, detail=results["error"])
+    
+    return {"success": True, "prefix": prefix, "suggestions": results["suggestions"]}
+
 @app.get("/health")
 def health_check():
     """서비스 상태 확인"""
     try:
-        # 간단한 검색으로 시스템 상태 확인
-        test_result = search_vat_law("부가가치세", top_k=1)
+        # 모델 로딩 중에는 검색을 기다리지 않고 시작 중 상태로 응답
+        if get_model_status() == "loading":
+            return {
+                "status": "starting",
+                "service": "부가가치세법 RAG 검색 시스템",
+                "search_engine": "loading",
+                "timestamp": "2025-06-16"
+            }
+        
+        # 간단한 검색으로 시스템 상태 확인 (캐시된 결과가 아니라 실제 검색 경로를 확인)
+        test_result = search_vat_law("부가가치세", top_k=1, runner=inference_executor.run, use_cache=False)
         
         return {
             "status": "healthy",
@@ -151,6 +319,12 @@ def health_check():
             "search_engine": "ready" if "error" not in test_result else "error",
             "timestamp": "2025-06-16"
         }
+    except (QueueFullError, DeadlineExceededError) as overload_error:
+        return {
+            "status": "overloaded",
+            "error": str(overload_error),
+            "timestamp": "2025-06-16"
+        }
     except Exception as health_error:
         print(f"❌ 헬스체크 오류: {health_error}")
         return {
@@ -188,6 +362,13 @@ def get_sample_queries():
     }
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="부가가치세법 RAG 검색 서버")
+    parser.add_argument("--query-log", default=QUERY_LOG_FILE, help="검색 로그 파일 (빈 문자열이면 비활성화)")
+    parser.add_argument("--prewarm", type=int, default=PREWARM_TOP_N, help="시작 시 캐시를 예열할 상위 쿼리 수")
+    args = parser.parse_args()
+    QUERY_LOG_FILE = args.query_log
+    PREWARM_TOP_N = args.prewarm
+    
     print("🚀 부가가치세법 RAG 검색 서버 시작...")
     print("📍 서버 주소: http://127.0.0.1:8000")
     print("📍 API 문서: http://127.0.0.1:8000/docs")
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# 메모리 예산 기본값 (MB). 환경변수 VAT_MODEL_MEMORY_BUDGET_MB로 조정
+DEFAULT_MEMORY_BUDGET_MB = 4096
+
+# 유휴 모델 언로딩 기준 (초). 환경변수 VAT_MODEL_IDLE_SECONDS로 조정, 0이면 유휴 언로딩 안 함
+DEFAULT_IDLE_SECONDS = 0
+
+class _ModelEntry:
+    def __init__(self, model, size_bytes: int, load_seconds: float):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.use_count = 0
+
+class ModelRegistry:
+    def __init__(self, memory_budget_mb: Optional[float] = None, idle_seconds: Optional[float] = None):
+        """프로세스 전역 임베딩 모델 레지스트리 초기화
+
+        모델은 처음 요청될 때 한 번만 로딩되어 모든 컴포넌트가 공유한다.
+        로딩된 모델 크기의 합이 예산을 넘으면 가장 오래 사용하지 않은 모델부터 내린다.
+        idle_seconds > 0이면 백그라운드 스레드가 그 시간 이상 사용하지 않은 모델을 주기적으로 내린다.
+        """
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.environ.get("VAT_MODEL_MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB))
+        if idle_seconds is None:
+            idle_seconds = float(os.environ.get("VAT_MODEL_IDLE_SECONDS", DEFAULT_IDLE_SECONDS))
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self._idle_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._models: "OrderedDict[Tuple[str, str], _ModelEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._tokenizers: Dict[Tuple[str, str], Any] = {}
+        self._resolved_revisions: Dict[Tuple[str, str], str] = {}
+        self.evicted_count = 0
+
+    @staticmethod
+    def _key(model_name: str, revision: Optional[str]) -> Tuple[str, str]:
+        return (model_name, revision or "default")
+
+    @staticmethod
+    def _estimate_size_bytes(model) -> int:
+        """파라미터/버퍼 기준 모델 메모리 사용량 추정"""
+        try:
+            size = sum(p.numel() * p.element_size() for p in model.parameters())
+            size += sum(b.numel() * b.element_size() for b in model.buffers())
+            return int(size)
+        except Exception:
+            return 0
+
+    def get_model(self, model_name: str, revision: Optional[str] = None):
+        """모델 반환 (로딩되지 않았으면 로딩)"""
+        key = self._key(model_name, revision)
+
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                entry.last_used = time.time()
+                entry.use_count += 1
+                return entry.model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # 같은 모델을 여러 스레드가 동시에 로딩하지 않도록 모델별 잠금
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    entry.last_used = time.time()
+                    entry.use_count += 1
+                    return entry.model
+
+            print(f"⏳ 모델 '{model_name}' 로딩 중...")
+            started = time.perf_counter()
+            # sentence_transformers(torch)는 무거우므로 실제로 모델이 필요할 때 import
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name, revision=revision)
+            load_seconds = time.perf_counter() - started
+            entry = _ModelEntry(model, self._estimate_size_bytes(model), load_seconds)
+            entry.use_count = 1
+            print(f"✅ 모델 로딩 완료: {model_name} ({load_seconds:.2f}초, {entry.size_bytes / 1024 / 1024:.0f}MB)")
+
+            with self._lock:
+                self._models[key] = entry
+                self._evict_over_budget_locked(keep=key)
+                self._start_idle_eviction_locked()
+            return model
+
+    def get_tokenizer(self, model_name: str, revision: Optional[str] = None):
+        """모델의 토크나이저 반환 (모델이 로딩되어 있지 않으면 토크나이저만 로딩)
+
+        청킹 워커처럼 토큰 수만 필요한 프로세스가 모델 전체를 올리지 않도록 한다.
+        """
+        key = self._key(model_name, revision)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                return entry.model.tokenizer
+            tokenizer = self._tokenizers.get(key)
+        if tokenizer is not None:
+            return tokenizer
+
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+        with self._lock:
+            return self._tokenizers.setdefault(key, tokenizer)
+
+    def resolve_revision(self, model_name: str, revision: Optional[str] = None) -> Optional[str]:
+        """모델 스냅샷을 식별하는 고정 리비전 반환 (확인할 수 없으면 None)
+
+        허브 모델은 로컬 캐시의 스냅샷 커밋 해시, 로컬 디렉터리 모델은 파일 목록/크기/수정 시각 해시를 쓴다.
+        revision이 None이나 브랜치 이름이어도 실제로 받은 스냅샷으로 풀리므로
+        허브 모델이 갱신되면 다른 리비전이 된다.
+        """
+        if revision and re.fullmatch(r'[0-9a-f]{40}', revision):
+            return revision
+
+        key = self._key(model_name, revision)
+        with self._lock:
+            resolved = self._resolved_revisions.get(key)
+        if resolved is not None:
+            return resolved
+
+        if os.path.isdir(model_name):
+            fingerprint = hashlib.sha256()
+            for root, _, files in sorted(os.walk(model_name)):
+                for name in sorted(files):
+                    stat = os.stat(os.path.join(root, name))
+                    relative = os.path.relpath(os.path.join(root, name), model_name)
+                    fingerprint.update(f"{relative}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+            resolved = f"local-{fingerprint.hexdigest()[:40]}"
+        else:
+            try:
+                from huggingface_hub import snapshot_download
+                snapshot_path = snapshot_download(model_name, revision=revision, local_files_only=True)
+                resolved = os.path.basename(os.path.normpath(snapshot_path))
+            except Exception:
+                return None
+
+        with self._lock:
+            self._resolved_revisions[key] = resolved
+        return resolved
+
+    def get_max_seq_length(self, model_name: str, revision: Optional[str] = None) -> int:
+        """모델 최대 입력 토큰 수 (모델을 올리지 않고 설정 파일/토크나이저에서 확인)
+
+        캐시만으로 끝나는 재빌드가 청크 크기를 알기 위해 torch와 가중치를 올리지 않도록 한다.
+        """
+        key = self._key(model_name, revision)
+        with self._lock:
+            entry = self._models.get(key)
+        if entry is not None:
+            return int(entry.model.max_seq_length)
+
+        # sentence-transformers 설정 (sentence_bert_config.json의 max_seq_length)
+        try:
+            if os.path.isdir(model_name):
+                config_file = os.path.join(model_name, "sentence_bert_config.json")
+            else:
+                from huggingface_hub import hf_hub_download
+                config_file = hf_hub_download(model_name, "sentence_bert_config.json", revision=revision)
+            with open(config_file, 'r', encoding='utf-8') as f:
+                max_seq_length = json.load(f).get("max_seq_length")
+            if max_seq_length:
+                return int(max_seq_length)
+        except Exception:
+            pass
+
+        # 설정 파일이 없으면 토크나이저 한도 (정의되지 않은 경우 매우 큰 값이므로 512로 제한)
+        tokenizer = self.get_tokenizer(model_name, revision)
+        return int(min(getattr(tokenizer, "model_max_length", 512) or 512, 512))
+
+    def _evict_over_budget_locked(self, keep: Tuple[str, str]) -> None:
+        """메모리 예산 초과 시 가장 오래 사용하지 않은 모델부터 제거"""
+        total_bytes = sum(entry.size_bytes for entry in self._models.values())
+        for key in list(self._models.keys()):
+            if total_bytes <= self.memory_budget_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self._models.pop(key)
+            total_bytes -= entry.size_bytes
+            self.evicted_count += 1
+            print(f"🧹 모델 언로딩 (메모리 예산 초과): {key[0]}")
+
+    def evict_idle(self, max_idle_seconds: float) -> int:
+        """일정 시간 이상 사용하지 않은 모델 제거"""
+        now = time.time()
+        with self._lock:
+            idle_keys = [key for key, entry in self._models.items() if now - entry.last_used >= max_idle_seconds]
+            for key in idle_keys:
+                del self._models[key]
+                print(f"🧹 모델 언로딩 (유휴): {key[0]}")
+            self.evicted_count += len(idle_keys)
+        return len(idle_keys)
+
+    def _start_idle_eviction_locked(self) -> None:
+        """유휴 언로딩 스레드 시작 (첫 모델 로딩 시 한 번)"""
+        if self.idle_seconds <= 0 or self._idle_thread is not None:
+            return
+        self._idle_thread = threading.Thread(target=self._idle_eviction_loop, name="model-idle-eviction", daemon=True)
+        self._idle_thread.start()
+
+    def _idle_eviction_loop(self) -> None:
+        check_interval = max(1.0, min(self.idle_seconds / 2, 60.0))
+        while not self._stop_event.wait(check_interval):
+            try:
+                self.evict_idle(self.idle_seconds)
+            except Exception as eviction_error:
+                print(f"❌ 유휴 모델 언로딩 오류: {eviction_error}")
+
+    def shutdown(self) -> None:
+        """유휴 언로딩 스레드 종료"""
+        self._stop_event.set()
+        if self._idle_thread is not None:
+            self._idle_thread.join(timeout=5)
+
+    def is_loaded(self, model_name: str, revision: Optional[str] = None) -> bool:
+        """모델 로딩 여부"""
+        with self._lock:
+            return self._key(model_name, revision) in self._models
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """레지스트리 통계 (로딩 시간, 메모리 사용량)"""
+        now = time.time()
+        with self._lock:
+            models = [
+                {
+                    "model_name": key[0],
+                    "revision": key[1],
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "size_mb": round(entry.size_bytes / 1024 / 1024, 1),
+                    "idle_seconds": round(now - entry.last_used, 1),
+                    "use_count": entry.use_count
+                }
+                for key, entry in self._models.items()
+            ]
+            total_bytes = sum(entry.size_bytes for entry in self._models.values())
+        return {
+            "loaded_models": models,
+            "total_size_mb": round(total_bytes / 1024 / 1024, 1),
+            "memory_budget_mb": round(self.memory_budget_bytes / 1024 / 1024, 1),
+            "idle_seconds": self.idle_seconds,
+            "evicted_count": self.evicted_count
+        }
+
+# 프로세스 전역 레지스트리
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """프로세스 전역 모델 레지스트리 반환"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+def get_model(model_name: str, revision: Optional[str] = None):
+    """전역 레지스트리에서 모델 반환"""
+    return get_model_registry().get_model(model_name, revision)
+
+def resolve_revision(model_name: str, revision: Optional[str] = None) -> Optional[str]:
+    """전역 레지스트리에서 모델 스냅샷 리비전 확인"""
+    return get_model_registry().resolve_revision(model_name, revision)
+
+def get_max_seq_length(model_name: str, revision: Optional[str] = None) -> int:
+    """전역 레지스트리에서 모델 최대 입력 토큰 수 확인"""
+    return get_model_registry().get_max_seq_length(model_name, revision)
+
+def get_tokenizer(model_name: str, revision: Optional[str] = None):
+    """전역 레지스트리에서 토크나이저 반환"""
+    return get_model_registry().get_tokenizer(model_name, revision)
@@ -1,57 +1,146 @@
 # -*- coding: utf-8 -*-
 import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from vat_model_registry import get_model, get_tokenizer, get_max_seq_length, resolve_revision
+from vat_embedding_cache import EmbeddingCache
+from vat_autocomplete import AutocompleteIndex, get_autocomplete_file
+from vat_sharded_search import save_shards
+from vat_projection import EmbeddingProjection, get_projection_file, project_processed_data
+from typing import List, Dict, Any, Optional, Tuple
 import re
 import sys
+import datetime
 import os
+import argparse
+import zipfile
+from xml.etree import ElementTree
 
-# Windows 콘솔 인코딩 설정
-if sys.platform.startswith('win'):
-    os.system('chcp 65001')  # UTF-8 코드페이지로 변경
+# 조문 시작 패턴: "**제X조(제목)**" (마크다운) 또는 "제X조의2(제목) 본문..." (일반 텍스트)
+ARTICLE_HEADER_PATTERN = r'(?:\*\*)?제(\d+조(?:의\d+)?)\(([^)]+)\)(?:\*\*)?'
+
+# 조문이 아닌 구획 경계: 편/장/절/관 제목, 법령 머리말("[시행 2025. 1. 1.] ..."), 부칙 시작
+SECTION_HEADER_PATTERN = r'(?:\*\*|#+\s*)?(?:제\d+(?:편|장|절|관)(?:의\d+)?\s|\[시행\s)'
+ADDENDUM_HEADER_PATTERN = r'(?:\*\*|#+\s*)?부\s*칙(?:\s*<([^>]*)>)?'
+
+# 같은 조문이 개정 전/후로 함께 실린 경우 개정 조문 끝의 시행일 표시: "[시행일: 2025. 7. 1.] 제52조"
+EFFECTIVE_DATE_PATTERN = r'\[시행일\s*:\s*(\d{4})\.\s*(\d{1,2})\.\s*(\d{1,2})\.\]'
+
+_WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+def read_document_text(file_path: str) -> str:
+    """법령 문서 텍스트 읽기 (.docx는 문단 단위 줄바꿈, 그 외는 UTF-8 텍스트)"""
+    if file_path.lower().endswith('.docx'):
+        with zipfile.ZipFile(file_path) as docx:
+            root = ElementTree.fromstring(docx.read('word/document.xml'))
+        paragraphs = []
+        for paragraph in root.iter(f'{_WORD_NAMESPACE}p'):
+            paragraphs.append(''.join(node.text or '' for node in paragraph.iter(f'{_WORD_NAMESPACE}t')))
+        return '\n'.join(paragraphs)
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+# 청킹 분할 경계: 항(①~⑮) → 호(1. 2. ...) → 문장 → 어절
+SPLIT_PATTERNS = [
+    r'(?=[①②③④⑤⑥⑦⑧⑨⑩⑪⑫⑬⑭⑮])',
+    r'\s+(?=\d{1,2}\.\s)',
+    r'(?<=[.?!])\s+',
+    r'\s+',
+]
 
 class VATLawProcessor:
-    def __init__(self, model_name: str = "jhgan/ko-sbert-nli"):
-        """부가가치세법 전처리기 초기화"""
-        print(f"모델 '{model_name}' 로딩 중...")
-        self.model = SentenceTransformer(model_name)
-        print("모델 로딩 완료!")
-        
-    def extract_articles_from_docx(self, docx_content: str) -> List[Dict[str, str]]:
-        """업로드된 부가가치세법 문서에서 조문 추출"""
+    def __init__(self, model_name: str = "jhgan/ko-sbert-nli", max_chunk_tokens: Optional[int] = None,
+                 chunk_overlap_tokens: int = 0, model_revision: Optional[str] = None,
+                 cache_file: Optional[str] = "vat_embedding_cache.db", load_model: bool = False):
+        """부가가치세법 전처리기 초기화
+        
+        max_chunk_tokens를 지정하지 않으면 모델의 max_seq_length에 맞춘다.
+        cache_file이 None이면 임베딩 캐시를 사용하지 않는다.
+        모델은 임베딩 캐시에 없는 텍스트를 처음 인코딩할 때 로딩한다 (load_model=True이면 미리 로딩).
+        캐시만으로 끝나는 재빌드는 토크나이저와 설정 파일만 읽는다.
+        """
+        self.model_name = model_name
+        self.model_revision = model_revision
+        self.max_chunk_tokens = max_chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.embedding_cache = EmbeddingCache(cache_file) if cache_file else None
+        
+        # 모델은 전역 레지스트리에서 공유 (이미 로딩되어 있으면 재사용)
+        if load_model:
+            get_model(self.model_name, self.model_revision)
+    
+    @property
+    def model(self):
+        """공유 모델 레지스트리의 임베딩 모델"""
+        return get_model(self.model_name, self.model_revision)
+    
+    @property
+    def tokenizer(self):
+        """임베딩 모델의 토크나이저 (모델이 없으면 토크나이저만 로딩)"""
+        return get_tokenizer(self.model_name, self.model_revision)
+        
+    def extract_articles_from_docx(self, docx_content: str, law_name: str = '부가가치세법',
+                                   as_of: Optional[datetime.date] = None) -> List[Dict[str, str]]:
+        """업로드된 법령 문서에서 조문 추출
+        
+        목차처럼 본문 없이 제목만 이어지는 조문은 버리고, 장/절 제목과 법령 머리말에서 조문을 끊는다.
+        부칙 조문은 "부칙(제20614호) 제2조"처럼 번호 앞에 부칙을 붙여 본칙 조문과 구분한다.
+        같은 번호의 조문이 개정 전/후로 두 번 실려 있으면 as_of(기본: 오늘) 기준 시행 중인 마지막 판만 남긴다.
+        """
         articles = []
         
         # 실제 부가가치세법 조문들을 추출
-        # 조문 패턴: **제X조(제목)**
+        # 조문 패턴: **제X조(제목)** 또는 제X조(제목) 본문...
         lines = docx_content.split('\n')
         current_article = None
         current_title = None
         current_content = []
+        article_prefix = ''
+        
+        def save_current_article():
+            if current_article and current_content:
+                content_text = ' '.join(current_content).strip()
+                if len(content_text) > 30:  # 의미있는 내용만 (목차 항목은 여기서 걸러짐)
+                    articles.append({
+                        'article_number': current_article,
+                        'title': current_title,
+                        'content': content_text,
+                        'law_name': law_name
+                    })
         
         for line in lines:
             line = line.strip()
             if not line:
                 continue
+            
+            # 부칙 시작: 이후 조문 번호는 부칙 네임스페이스
+            addendum_match = re.fullmatch(ADDENDUM_HEADER_PATTERN + r'(?:\*\*)?', line)
+            if addendum_match:
+                save_current_article()
+                current_article = None
+                promulgation = re.sub(r'[,\s].*', '', addendum_match.group(1) or '')
+                article_prefix = f"부칙({promulgation}) " if promulgation else "부칙 "
+                continue
+            
+            # 장/절 제목, 법령 머리말: 진행 중인 조문 종료
+            if re.match(SECTION_HEADER_PATTERN, line + ' '):
+                save_current_article()
+                current_article = None
+                continue
                 
             # 조문 시작 패턴 찾기
-            article_match = re.match(r'\*\*제(\d+(?:조의\d+)?조)\(([^)]+)\)\*\*', line)
+            article_match = re.match(ARTICLE_HEADER_PATTERN, line)
             if article_match:
                 # 이전 조문 저장
-                if current_article and current_content:
-                    content_text = ' '.join(current_content).strip()
-                    if len(content_text) > 30:  # 의미있는 내용만
-                        articles.append({
-                            'article_number': current_article,
-                            'title': current_title,
-                            'content': content_text,
-                            'law_name': '부가가치세법'
-                        })
+                save_current_article()
                 
-                # 새 조문 시작
-                current_article = f"제{article_match.group(1)}"
+                # 새 조문 시작 (제목 뒤에 같은 줄로 이어지는 본문 포함)
+                current_article = f"{article_prefix}제{article_match.group(1)}"
                 current_title = article_match.group(2)
                 current_content = []
+                header_rest = re.sub(r'\*\*|`|#', '', line[article_match.end():]).strip()
+                if header_rest:
+                    current_content.append(header_rest)
             else:
                 # 조문 내용 추가
                 if current_article and line:
@@ -61,49 +150,160 @@ class VATLawProcessor:
                         current_content.append(cleaned_line)
         
         # 마지막 조문 저장
-        if current_article and current_content:
-            content_text = ' '.join(current_content).strip()
-            if len(content_text) > 30:
-                articles.append({
-                    'article_number': current_article,
-                    'title': current_title,
-                    'content': content_text,
-                    'law_name': '부가가치세법'
-                })
-        
-        return articles
-    
-    def chunk_article_content(self, content: str, max_length: int = 400) -> List[str]:
-        """조문 내용을 청킹"""
-        if len(content) <= max_length:
-            return [content]
+        save_current_article()
         
-        chunks = []
+        return self._select_effective_versions(articles, as_of or datetime.date.today())
+    
+    @staticmethod
+    def _select_effective_versions(articles: List[Dict[str, str]], as_of: datetime.date) -> List[Dict[str, str]]:
+        """같은 번호 조문이 여러 판이면 as_of 기준 시행 중인 가장 늦은 판만 남김 (조문 순서 유지)
+        
+        시행일 표시가 잘못된 판(예: "2025. 13. 1.")은 건너뛴다.
+        """
+        selected = {}
+        dates = {}
+        order = []
+        for article in articles:
+            number = article['article_number']
+            match = re.search(EFFECTIVE_DATE_PATTERN, article['content'])
+            try:
+                candidate_date = datetime.date(*map(int, match.groups())) if match else datetime.date.min
+            except ValueError:
+                print(f"시행일 형식 오류로 건너뜀: {article['law_name']} {number} {match.group(0)}")
+                continue
+            
+            if number not in selected:
+                order.append(number)
+            else:
+                current_date = dates[number]
+                if not (current_date <= candidate_date <= as_of or current_date > as_of >= candidate_date):
+                    continue
+            selected[number] = article
+            dates[number] = candidate_date
+        return [selected[number] for number in order]
+    
+    def count_tokens(self, text: str) -> int:
+        """모델 토크나이저 기준 토큰 수 (특수 토큰 제외)"""
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+    
+    def get_max_chunk_tokens(self) -> int:
+        """청크당 허용 토큰 수 ([CLS]/[SEP] 특수 토큰 자리 제외)"""
+        if self.max_chunk_tokens:
+            return self.max_chunk_tokens
+        return max(get_max_seq_length(self.model_name, self.model_revision) - 2, 1)
+    
+    def _split_fragments(self, text: str, budget: int, level: int = 0) -> List[Tuple[str, int]]:
+        """항 → 호 → 문장 → 어절 순으로 토큰 예산 이하가 될 때까지 분할"""
+        text = text.strip()
+        if not text:
+            return []
         
-        # 1. 항목별 분할 (①, ②, ③ 등)
-        item_pattern = r'[①②③④⑤⑥⑦⑧⑨⑩⑪⑫⑬⑭⑮]'
-        items = re.split(f'({item_pattern})', content)
+        token_count = self.count_tokens(text)
+        if token_count <= budget:
+            return [(text, token_count)]
         
-        current_chunk = ""
+        if level >= len(SPLIT_PATTERNS):
+            # 어절 하나가 예산을 넘는 경우는 그대로 둔다 (모델에서 잘림)
+            return [(text, token_count)]
         
-        for item in items:
-            if not item.strip():
-                continue
+        parts = [part for part in re.split(SPLIT_PATTERNS[level], text) if part.strip()]
+        if len(parts) <= 1:
+            return self._split_fragments(text, budget, level + 1)
+        
+        fragments = []
+        for part in parts:
+            fragments.extend(self._split_fragments(part, budget, level + 1))
+        return fragments
+    
+    def chunk_article_content(self, content: str, max_tokens: Optional[int] = None,
+                              overlap_tokens: Optional[int] = None) -> List[str]:
+        """조문 내용을 모델 토큰 수 기준으로 청킹
+        
+        항(①②...)/호(1. 2. ...)/문장 경계에서 분할한 조각들을 토큰 예산에 가깝게 묶는다.
+        WordPiece 토크나이저는 공백 단위로 먼저 자르므로 조각별 토큰 수의 합이 곧 청크의 토큰 수다.
+        overlap_tokens > 0 이면 이전 청크의 마지막 조각들을 다음 청크 앞에 겹쳐 넣는다.
+        """
+        budget = max_tokens or self.get_max_chunk_tokens()
+        overlap = self.chunk_overlap_tokens if overlap_tokens is None else overlap_tokens
+        overlap = min(overlap, budget // 2)
+        
+        fragments = self._split_fragments(content, budget)
+        if not fragments:
+            return [content]
+        
+        chunks = []
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        
+        for fragment, fragment_tokens in fragments:
+            if current and current_tokens + fragment_tokens > budget:
+                chunks.append(' '.join(text for text, _ in current))
                 
-            test_chunk = current_chunk + item
+                # 다음 청크에 겹쳐 넣을 꼬리 조각 선택
+                carried: List[Tuple[str, int]] = []
+                carried_tokens = 0
+                for text, tokens in reversed(current):
+                    if carried_tokens + tokens > overlap or carried_tokens + tokens + fragment_tokens > budget:
+                        break
+                    carried.insert(0, (text, tokens))
+                    carried_tokens += tokens
+                
+                current = carried
+                current_tokens = carried_tokens
             
-            if len(test_chunk) <= max_length:
-                current_chunk = test_chunk
-            else:
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                current_chunk = item
+            current.append((fragment, fragment_tokens))
+            current_tokens += fragment_tokens
         
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        if current:
+            chunks.append(' '.join(text for text, _ in current))
         
         return chunks if chunks else [content]
     
+    def _encode_with_model(self, texts: List[str], batch_size: int, encoder_workers: int) -> np.ndarray:
+        """모델로 인코딩 (encoder_workers > 1이면 sentence-transformers 멀티프로세스 풀 사용)"""
+        if encoder_workers <= 1 or len(texts) < batch_size * encoder_workers:
+            return np.asarray(self.model.encode(texts, batch_size=batch_size, convert_to_tensor=False), dtype=np.float32)
+        
+        pool = self.model.start_multi_process_pool(target_devices=['cpu'] * encoder_workers)
+        try:
+            return np.asarray(self.model.encode_multi_process(texts, pool, batch_size=batch_size), dtype=np.float32)
+        finally:
+            self.model.stop_multi_process_pool(pool)
+    
+    def _get_cache_revision(self) -> Optional[str]:
+        """임베딩 캐시 키로 쓸 모델 스냅샷 리비전 (로컬에 스냅샷이 없으면 모델을 받은 뒤 다시 확인)"""
+        revision = resolve_revision(self.model_name, self.model_revision)
+        if revision is None:
+            get_model(self.model_name, self.model_revision)
+            revision = resolve_revision(self.model_name, self.model_revision)
+        return revision
+    
+    def encode_texts(self, texts: List[str], batch_size: int = 32, encoder_workers: int = 1) -> np.ndarray:
+        """텍스트 목록 벡터화 (임베딩 캐시 우선 조회 후 누락분만 일괄 인코딩)"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        if self.embedding_cache is None:
+            return self._encode_with_model(texts, batch_size, encoder_workers)
+        
+        cache_revision = self._get_cache_revision()
+        if cache_revision is None:
+            print("임베딩 캐시 사용 안 함: 모델 스냅샷 리비전을 확인할 수 없습니다")
+            return self._encode_with_model(texts, batch_size, encoder_workers)
+        
+        cached = self.embedding_cache.get_many(self.model_name, cache_revision, texts)
+        missing_indices = [i for i, embedding in enumerate(cached) if embedding is None]
+        print(f"임베딩 캐시: 적중 {len(texts) - len(missing_indices)}개, 계산 필요 {len(missing_indices)}개")
+        
+        if missing_indices:
+            missing_texts = [texts[i] for i in missing_indices]
+            encoded = self._encode_with_model(missing_texts, batch_size, encoder_workers)
+            self.embedding_cache.put_many(self.model_name, cache_revision, missing_texts, encoded)
+            for i, embedding in zip(missing_indices, encoded):
+                cached[i] = embedding
+        
+        return np.asarray(cached, dtype=np.float32)
+    
     def create_sample_data(self) -> List[Dict[str, str]]:
         """샘플 부가가치세법 데이터 생성"""
         return [
@@ -165,45 +365,42 @@ class VATLawProcessor:
         articles = self.create_sample_data()
         print(f"총 {len(articles)}개 조문 추출 완료")
         
-        # 청킹 및 벡터화
-        processed_data = []
-        total_chunks = 0
-        
+        # 조문 청킹
+        chunk_records = []
         for article_idx, article in enumerate(articles):
             print(f"처리 중: {article['article_number']} {article['title']} ({article_idx + 1}/{len(articles)})")
-            
-            # 조문 청킹
-            chunks = self.chunk_article_content(article['content'])
-            
-            for chunk_idx, chunk in enumerate(chunks):
-                # 벡터화
-                try:
-                    embedding = self.model.encode(chunk, convert_to_tensor=False)
-                    
-                    # 메타데이터와 함께 저장
-                    chunk_data = {
-                        'id': f"vat_{article_idx}_{chunk_idx}",
-                        'law_name': article['law_name'],
-                        'article_number': article['article_number'],
-                        'article_title': article['title'],
-                        'full_content': article['content'],
-                        'chunk_content': chunk,
-                        'chunk_index': chunk_idx,
-                        'embedding': embedding.tolist(),
-                        'embedding_dim': len(embedding)
-                    }
-                    
-                    processed_data.append(chunk_data)
-                    total_chunks += 1
-                except Exception as e:
-                    print(f"벡터화 오류 (건너뜀): {e}")
-                    continue
+            for chunk_idx, chunk in enumerate(self.chunk_article_content(article['content'])):
+                chunk_records.append((article_idx, chunk_idx, article, chunk))
+        
+        # 벡터화 (캐시에 없는 청크만 모델로 계산)
+        try:
+            embeddings = self.encode_texts([chunk for _, _, _, chunk in chunk_records])
+        except Exception as e:
+            print(f"벡터화 오류: {e}")
+            return []
         
-        print(f"전처리 완료: {len(articles)}개 조문, {total_chunks}개 청크 생성")
+        processed_data = []
+        for (article_idx, chunk_idx, article, chunk), embedding in zip(chunk_records, embeddings):
+            # 메타데이터와 함께 저장
+            processed_data.append({
+                'id': f"vat_{article_idx}_{chunk_idx}",
+                'law_name': article['law_name'],
+                'article_number': article['article_number'],
+                'article_title': article['title'],
+                'full_content': article['content'],
+                'chunk_content': chunk,
+                'chunk_index': chunk_idx,
+                'embedding': embedding.tolist(),
+                'embedding_dim': len(embedding)
+            })
+        total_chunks = len(processed_data)
+        
+        print(f"전처리 완료: {len(articles)}개 조문, {total_chunks}개 청크 생성 (청크당 최대 {self.get_max_chunk_tokens()} 토큰)")
         return processed_data
     
-    def save_processed_data(self, processed_data: List[Dict], output_file: str):
-        """처리된 데이터 저장"""
+    def save_processed_data(self, processed_data: List[Dict], output_file: str,
+                            projection: Optional[EmbeddingProjection] = None):
+        """처리된 데이터 저장 (차원 축소했으면 쿼리용 투영도 함께 저장)"""
         print(f"'{output_file}'에 저장 중...")
         
         try:
@@ -211,11 +408,35 @@ class VATLawProcessor:
                 pickle.dump(processed_data, f)
             
             print(f"저장 완료: {len(processed_data)}개 청크")
+            
+            # 조문 번호/제목/법률 용어 자동완성 인덱스
+            autocomplete_file = get_autocomplete_file(output_file)
+            autocomplete_index = AutocompleteIndex.build(processed_data)
+            autocomplete_index.save(autocomplete_file)
+            print(f"자동완성 인덱스 저장 완료: {autocomplete_file} ({len(autocomplete_index)}개 항목)")
+            
+            # 쿼리 임베딩에도 같은 투영을 적용하도록 저장 (축소하지 않았으면 이전 투영 파일 제거)
+            projection_file = get_projection_file(output_file)
+            if projection is not None:
+                projection.save(projection_file)
+                print(f"차원 축소 투영 저장 완료: {projection_file} ({projection.input_dim} → {projection.output_dim})")
+            elif os.path.exists(projection_file):
+                os.remove(projection_file)
         except Exception as e:
             print(f"저장 오류: {e}")
 
 def main():
     """부가가치세법 전처리 실행"""
+    parser = argparse.ArgumentParser(description="부가가치세법 RAG 시스템 데이터 전처리")
+    parser.add_argument("--output", default="vat_law_processed.pkl", help="저장 파일")
+    parser.add_argument("--shards", type=int, default=0, help="샤드 분산 검색용으로 나눌 샤드 수 (0이면 나누지 않음)")
+    parser.add_argument("--projection-dim", type=int, default=0, help="임베딩 축소 차원 (0이면 축소하지 않음)")
+    args = parser.parse_args()
+    
+    # Windows 콘솔 인코딩 설정 (import 시점이 아니라 스크립트 실행 시에만)
+    if sys.platform.startswith('win'):
+        os.system('chcp 65001')  # UTF-8 코드페이지로 변경
+    
     try:
         print("=" * 60)
         print("부가가치세법 RAG 시스템 데이터 전처리")
@@ -231,15 +452,31 @@ def main():
             print("처리된 데이터가 없습니다. 오류를 확인해주세요.")
             return
         
+        # 차원 축소 (코퍼스로 투영 학습 후 축소된 임베딩 저장)
+        projection = None
+        if args.projection_dim > 0:
+            projection = project_processed_data(processed_data, args.projection_dim, processor.model_name)
+            print(f"차원 축소: {projection.input_dim} → {projection.output_dim} (설명 분산 {projection.explained_variance_ratio:.1%})")
+        
         # 저장
-        processor.save_processed_data(processed_data, 'vat_law_processed.pkl')
+        processor.save_processed_data(processed_data, args.output, projection)
+        
+        # 샤드 분할 저장
+        if args.shards > 0:
+            manifest_file = save_shards(processed_data, args.output, args.shards)
+            print(f"샤드 목록 저장 완료: {manifest_file}")
         
         print("\n" + "=" * 60)
         print("처리 통계:")
         print(f"   총 청크 수: {len(processed_data)}")
         print(f"   임베딩 차원: {processed_data[0]['embedding_dim']}")
-        print(f"   모델: jhgan/ko-sbert-nli")
-        print(f"   저장 파일: vat_law_processed.pkl")
+        print(f"   모델: {processor.model_name}")
+        if processor.embedding_cache is not None:
+            cache_stats = processor.embedding_cache.get_statistics()
+            print(f"   임베딩 캐시: {cache_stats['cache_file']} ({cache_stats['entries']}개, {cache_stats['size_mb']}MB)")
+        print(f"   저장 파일: {args.output}")
+        if args.shards > 0:
+            print(f"   샤드 수: {args.shards}")
         print("=" * 60)
         print("전처리 완료! 이제 'python main.py'를 실행하세요.")
         
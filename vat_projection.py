@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+def get_projection_file(data_file: str) -> str:
+    """전처리 데이터 파일에 대응하는 차원 축소 투영 파일 경로"""
+    base, _ = os.path.splitext(data_file)
+    return f"{base}.projection.pkl"
+
+class EmbeddingProjection:
+    def __init__(self, components: np.ndarray, explained_variance_ratio: float, model_name: Optional[str] = None):
+        """임베딩 차원 축소 투영 (input_dim x output_dim 행렬)
+
+        코퍼스 임베딩의 비중심 PCA(절단 SVD) 주성분으로 투영한다. 평균을 빼지 않으므로
+        투영 후 내적이 원래 내적의 근사가 되어 코사인 유사도 값의 범위와 임계값이 크게 바뀌지 않는다.
+        """
+        self.components = np.asarray(components, dtype=np.float32)
+        self.explained_variance_ratio = float(explained_variance_ratio)
+        self.model_name = model_name
+
+    @property
+    def input_dim(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def output_dim(self) -> int:
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, target_dim: int, model_name: Optional[str] = None) -> "EmbeddingProjection":
+        """코퍼스 임베딩으로 투영 학습 (numpy만 사용)"""
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        input_dim = embeddings.shape[1]
+        if not 0 < target_dim < input_dim:
+            raise ValueError(f"목표 차원은 1 이상 {input_dim} 미만이어야 합니다: {target_dim}")
+
+        # 정규화 벡터 기준 2차 모멘트 행렬(input_dim x input_dim)의 고유분해 → 청크 수와 무관한 비용
+        normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        eigenvalues, eigenvectors = np.linalg.eigh(normalized.T @ normalized)
+        order = np.argsort(eigenvalues)[::-1]
+        eigenvalues = np.maximum(eigenvalues[order], 0.0)
+        components = eigenvectors[:, order[:target_dim]]
+        explained = eigenvalues[:target_dim].sum() / max(eigenvalues.sum(), 1e-12)
+        return cls(components, explained, model_name)
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """임베딩(1개 또는 행렬)을 축소 차원으로 투영"""
+        return np.asarray(embeddings, dtype=np.float32) @ self.components
+
+    def save(self, output_file: str) -> None:
+        """투영 저장"""
+        with open(output_file, 'wb') as f:
+            pickle.dump({
+                'components': self.components,
+                'explained_variance_ratio': self.explained_variance_ratio,
+                'model_name': self.model_name
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, input_file: str) -> "EmbeddingProjection":
+        """투영 로드"""
+        with open(input_file, 'rb') as f:
+            state = pickle.load(f)
+        return cls(state['components'], state['explained_variance_ratio'], state.get('model_name'))
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "input_dim": self.input_dim,
+            "output_dim": self.output_dim,
+            "explained_variance_ratio": round(self.explained_variance_ratio, 4)
+        }
+
+def project_processed_data(processed_data: List[Dict], target_dim: int,
+                           model_name: Optional[str] = None) -> EmbeddingProjection:
+    """전처리 데이터의 임베딩으로 투영을 학습하고 각 청크 임베딩을 축소 차원으로 교체"""
+    embeddings = np.array([chunk['embedding'] for chunk in processed_data], dtype=np.float32)
+    projection = EmbeddingProjection.fit(embeddings, target_dim, model_name)
+    for chunk, reduced in zip(processed_data, projection.transform(embeddings)):
+        chunk['embedding'] = reduced.tolist()
+        chunk['embedding_dim'] = projection.output_dim
+    return projection
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    top_k = min(top_k, scores.shape[1])
+    return np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+def evaluate_recall(embeddings: np.ndarray, dims: List[int], top_k: int = 10,
+                    query_embeddings: Optional[np.ndarray] = None, sample_size: int = 500,
+                    seed: int = 0) -> List[Dict[str, Any]]:
+    """차원별 recall@k 측정 (원래 차원 검색 결과 top-k 중 축소 차원에서도 top-k에 드는 비율)
+
+    query_embeddings가 없으면 코퍼스 청크 일부를 쿼리로 사용한다.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if query_embeddings is None:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(embeddings), size=min(sample_size, len(embeddings)), replace=False)
+        query_embeddings = embeddings[sample]
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+
+    full_matrix = _normalize_rows(embeddings)
+    full_queries = _normalize_rows(query_embeddings)
+    started = time.perf_counter()
+    full_scores = full_queries @ full_matrix.T
+    full_seconds = time.perf_counter() - started
+    full_top = _top_k_indices(full_scores, top_k)
+
+    report = [{
+        "dim": embeddings.shape[1],
+        "recall": 1.0,
+        "explained_variance_ratio": 1.0,
+        "index_mb": round(full_matrix.nbytes / 1024 / 1024, 2),
+        "scoring_ms": round(full_seconds * 1000, 2)
+    }]
+    for dim in sorted(dims, reverse=True):
+        projection = EmbeddingProjection.fit(embeddings, dim)
+        reduced_matrix = _normalize_rows(projection.transform(embeddings))
+        reduced_queries = _normalize_rows(projection.transform(query_embeddings))
+        started = time.perf_counter()
+        reduced_scores = reduced_queries @ reduced_matrix.T
+        reduced_seconds = time.perf_counter() - started
+        reduced_top = _top_k_indices(reduced_scores, top_k)
+
+        hits = sum(len(set(full_row) & set(reduced_row)) for full_row, reduced_row in zip(full_top, reduced_top))
+        report.append({
+            "dim": dim,
+            "recall": round(hits / full_top.size, 4),
+            "explained_variance_ratio": round(projection.explained_variance_ratio, 4),
+            "index_mb": round(reduced_matrix.nbytes / 1024 / 1024, 2),
+            "scoring_ms": round(reduced_seconds * 1000, 2)
+        })
+    return report
+
+def main():
+    """차원별 recall 리포트 (축소 전 원래 차원 데이터 파일 필요)"""
+    parser = argparse.ArgumentParser(description="임베딩 차원 축소 recall 리포트")
+    parser.add_argument("--data", default="vat_law_processed.pkl", help="원래 차원으로 전처리된 데이터 파일")
+    parser.add_argument("--dims", type=int, nargs='+', default=[64, 128, 256, 384], help="비교할 축소 차원")
+    parser.add_argument("--top-k", type=int, default=10, help="recall@k의 k")
+    parser.add_argument("--queries", default=None, help="쿼리 파일 (한 줄에 하나, 지정하면 모델로 인코딩)")
+    parser.add_argument("--sample", type=int, default=500, help="쿼리 파일이 없을 때 쿼리로 쓸 청크 수")
+    parser.add_argument("--model", default="jhgan/ko-sbert-nli", help="쿼리 인코딩 모델")
+    parser.add_argument("--output", default=None, help="리포트를 JSON으로 저장할 파일")
+    args = parser.parse_args()
+
+    if os.path.exists(get_projection_file(args.data)):
+        print(f"❌ '{args.data}'는 이미 차원 축소된 데이터입니다. --projection-dim 없이 전처리한 파일을 지정해주세요.")
+        return
+
+    with open(args.data, 'rb') as f:
+        data = pickle.load(f)
+    embeddings = np.array([chunk['embedding'] for chunk in data], dtype=np.float32)
+    dims = [dim for dim in args.dims if 0 < dim < min(embeddings.shape)]
+    if len(dims) < len(args.dims):
+        print(f"⚠️ 청크 수/원래 차원({embeddings.shape[1]})보다 작은 차원만 비교합니다: {dims}")
+
+    query_embeddings = None
+    if args.queries:
+        from vat_model_registry import get_model
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        query_embeddings = np.asarray(get_model(args.model).encode(queries, convert_to_tensor=False))
+
+    report = evaluate_recall(embeddings, dims, args.top_k, query_embeddings, args.sample)
+
+    print(f"📐 차원별 recall@{args.top_k} ({len(data)}개 청크)")
+    print("-" * 60)
+    print(f"   {'차원':>6} {'recall':>8} {'설명분산':>8} {'인덱스(MB)':>10} {'유사도계산(ms)':>14}")
+    for row in report:
+        print(f"   {row['dim']:>6} {row['recall']:>8.4f} {row['explained_variance_ratio']:>8.4f} "
+              f"{row['index_mb']:>10.2f} {row['scoring_ms']:>14.2f}")
+    print("-" * 60)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 리포트 저장: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+class QueryLogger:
+    def __init__(self, log_file: str = "vat_query_log.jsonl", max_buffer: int = 10000,
+                 flush_interval: float = 1.0):
+        """비동기 버퍼 검색 로그 초기화
+
+        요청 스레드는 큐에 기록만 넣고 바로 반환하며, 파일 쓰기는 백그라운드 스레드가 모아서 한다.
+        버퍼가 가득 차면 요청을 막지 않고 해당 기록을 버린다 (dropped 카운트).
+        """
+        self.log_file = log_file
+        self.flush_interval = flush_interval
+        self.logged = 0
+        self.dropped = 0
+        self._stats_lock = threading.Lock()  # dropped는 요청 스레드와 기록 스레드가 함께 갱신
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="vat-query-log", daemon=True)
+        self._writer.start()
+
+    def log(self, endpoint: str, query: str, params: Dict[str, Any], latency_ms: float,
+            cache_status: Optional[str], status: int) -> None:
+        """검색 요청 한 건 기록 (블로킹 없음)"""
+        record = {
+            "ts": time.time(),
+            "endpoint": endpoint,
+            "query": query,
+            "params": params,
+            "latency_ms": round(latency_ms, 2),
+            "cache_status": cache_status,
+            "status": status
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def _write_records(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+            self.logged += len(records)
+        except Exception as write_error:
+            with self._stats_lock:
+                self.dropped += len(records)
+            print(f"❌ 검색 로그 기록 오류: {write_error}")
+
+    def _write_loop(self) -> None:
+        while not self._stop.is_set():
+            self._stop.wait(self.flush_interval)
+            self._write_records(self._drain())
+
+    def close(self) -> None:
+        """남은 기록을 모두 쓰고 종료"""
+        self._stop.set()
+        self._writer.join(timeout=5)
+        self._write_records(self._drain())
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """검색 로그 통계"""
+        return {
+            "log_file": self.log_file,
+            "logged": self.logged,
+            "buffered": self._queue.qsize(),
+            "dropped": self.dropped
+        }
+
+def read_query_log(log_file: str) -> Iterator[Dict[str, Any]]:
+    """검색 로그 읽기 (깨진 줄은 건너뜀)"""
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def get_top_queries(log_file: str, top_n: int, endpoint: str = "/search-law") -> List[Tuple[str, int, int]]:
+    """가장 자주 검색된 (검색어, max_results, 횟수) 목록"""
+    counter = Counter()
+    for record in read_query_log(log_file):
+        if record.get("endpoint") != endpoint or record.get("status") != 200:
+            continue
+        max_results = record.get("params", {}).get("max_results", 5)
+        counter[(record["query"], max_results)] += 1
+    return [(query, max_results, count) for (query, max_results), count in counter.most_common(top_n)]
@@ -0,0 +1,111 @@
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from vat_query_log import read_query_log
+
+# 엔드포인트별 요청 본문 필드명
+_QUERY_FIELDS = {
+    "/search-law": "keywords",
+    "/related-articles": "article_number"
+}
+
+def _send_request(base_url: str, record: Dict[str, Any], timeout: float):
+    """로그 한 건을 서버에 재전송하고 (상태 코드, 지연 시간 ms) 반환"""
+    body = {_QUERY_FIELDS[record["endpoint"]]: record["query"]}
+    body.update(record.get("params", {}))
+    request = urllib.request.Request(
+        base_url.rstrip('/') + record["endpoint"],
+        data=json.dumps(body, ensure_ascii=False).encode('utf-8'),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as http_error:
+        status = http_error.code
+    except Exception:
+        status = 0
+    return status, (time.perf_counter() - started) * 1000
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(len(values) * percent / 100), len(values) - 1)
+    return values[index]
+
+def replay_queries(log_file: str, base_url: str = "http://127.0.0.1:8000", speed: float = 1.0,
+                   concurrency: int = 16, limit: int = 0, timeout: float = 30.0) -> Dict[str, Any]:
+    """검색 로그의 트래픽을 원래 도착 간격 / speed 배율로 서버에 재생"""
+    records = [record for record in read_query_log(log_file) if record.get("endpoint") in _QUERY_FIELDS]
+    records.sort(key=lambda record: record["ts"])
+    if limit > 0:
+        records = records[:limit]
+    if not records:
+        print("❌ 재생할 검색 로그가 없습니다")
+        return {}
+
+    print(f"▶️ {len(records)}개 요청 재생 (속도 x{speed}, 동시 {concurrency}개) → {base_url}")
+
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def run(record):
+        status, latency_ms = _send_request(base_url, record, timeout)
+        with lock:
+            statuses[status] += 1
+            latencies.append(latency_ms)
+
+    first_ts = records[0]["ts"]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            # 원래 도착 시각에 맞춰 전송 (speed가 클수록 빠르게)
+            delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run, record)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "requests": len(records),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(records) / elapsed, 2) if elapsed > 0 else 0.0,
+        "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 2),
+            "p95": round(_percentile(latencies, 95), 2),
+            "p99": round(_percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2)
+        }
+    }
+    return report
+
+def main():
+    """검색 로그 재생 실행"""
+    parser = argparse.ArgumentParser(description="검색 로그 트래픽을 로컬 서버에 재생")
+    parser.add_argument("--log", default="vat_query_log.jsonl", help="검색 로그 파일")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="대상 서버 주소")
+    parser.add_argument("--speed", type=float, default=1.0, help="재생 속도 배율 (2.0이면 두 배 빠르게)")
+    parser.add_argument("--concurrency", type=int, default=16, help="최대 동시 요청 수")
+    parser.add_argument("--limit", type=int, default=0, help="재생할 최대 요청 수 (0이면 전체)")
+    args = parser.parse_args()
+
+    report = replay_queries(args.log, args.url, args.speed, args.concurrency, args.limit)
+    if report:
+        print("📊 재생 결과:")
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,80 @@
 from vat_vector_search import VATVectorSearch
+from vat_sharded_search import ShardedVATSearch
+from vat_inference_executor import QueueFullError, DeadlineExceededError
+from vat_autocomplete import AutocompleteIndex, get_autocomplete_file
+import copy
 import os
+import threading
 import traceback
+from collections import OrderedDict
 
-# 🚀 전역 검색 엔진 (서버 시작 시 한 번만 초기화)
+# 🚀 전역 검색 엔진 (서버 시작 이벤트에서 한 번만 초기화, 그 전 요청은 처음 쓸 때 초기화)
+# import 시점에 초기화하지 않는다: spawn 샤드 워커가 메인 모듈을 다시 import할 때 검색 엔진(샤드 풀)을 또 만들게 된다
 search_engine = None
 
+# 📄 전처리된 데이터 파일
+DATA_FILE = "vat_law_processed.pkl"
+
+# 🧠 warm_up_model로 모델을 로딩 중인 스레드 수 (헬스체크의 loading 상태 판단용)
+_model_loading_count = 0
+_model_loading_lock = threading.Lock()
+
+# 🔤 자동완성 인덱스 (검색 엔진과 별도로 인덱스 파일만 읽어 사용)
+_autocomplete_index = None
+_autocomplete_lock = threading.Lock()
+
+# 🧩 샤드 분산 검색 사용 여부 (vat_preprocessor.py --shards N 으로 샤드를 만든 뒤 VAT_SHARDED_SEARCH=1)
+USE_SHARDED_SEARCH = os.environ.get("VAT_SHARDED_SEARCH", "0") == "1"
+
+# 🔀 동일 요청 병합 (single-flight): 같은 (검색어, top_k) 요청이 동시에 들어오면 한 번만 계산
+class _InFlightSearch:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_in_flight_lock = threading.Lock()
+_in_flight_searches = {}
+_single_flight_stats = {"computations": 0, "coalesced": 0}
+
+# 🗃️ 검색 결과 LRU 캐시 (인덱스는 서버 실행 중 바뀌지 않으므로 만료 없음)
+RESULT_CACHE_SIZE = int(os.environ.get("VAT_RESULT_CACHE_SIZE", 256))
+_result_cache = OrderedDict()
+_result_cache_stats = {"hits": 0, "misses": 0}
+
+def warm_up_model():
+    """임베딩 모델 로딩 (서버 시작 후 백그라운드 스레드에서 호출)
+    
+    레지스트리가 모델별로 잠그므로 여러 스레드가 동시에 호출해도 한 번만 로딩하고 나머지는 기다린다.
+    """
+    global _model_loading_count
+    
+    if search_engine is None:
+        return False
+    with _model_loading_lock:
+        _model_loading_count += 1
+    try:
+        search_engine.model
+        return True
+    except Exception as model_error:
+        print(f"❌ 모델 로딩 실패: {model_error}")
+        return False
+    finally:
+        with _model_loading_lock:
+            _model_loading_count -= 1
+
+def get_model_status():
+    """모델 상태: unavailable(검색 엔진 없음) / ready / loading(warm_up_model 진행 중) / not_loaded
+    
+    not_loaded는 예열을 끈 채 아직 검색이 없었거나 유휴 시간이 지나 모델이 내려간 상태로, 다음 검색 때 로딩된다.
+    """
+    if search_engine is None:
+        return "unavailable"
+    if search_engine.is_model_loaded():
+        return "ready"
+    with _model_loading_lock:
+        return "loading" if _model_loading_count > 0 else "not_loaded"
+
 def initialize_vat_search_engine():
     """부가가치세법 검색 엔진 초기화"""
     global search_engine
@@ -13,13 +83,13 @@ def initialize_vat_search_engine():
         print("🚀 부가가치세법 RAG 검색 엔진 초기화 중...")
         
         # 전처리된 데이터 파일 확인
-        if not os.path.exists("vat_law_processed.pkl"):
+        if not os.path.exists(DATA_FILE):
             print("❌ 전처리된 데이터가 없습니다!")
             print("   다음 명령을 실행해주세요: python vat_preprocessor.py")
             return False
         
         try:
-            search_engine = VATVectorSearch()
+            search_engine = ShardedVATSearch() if USE_SHARDED_SEARCH else VATVectorSearch()
             print("✅ 부가가치세법 RAG 검색 엔진 초기화 완료!")
             return True
         except Exception as init_error:
@@ -29,17 +99,116 @@ def initialize_vat_search_engine():
     
     return True
 
-def search_vat_law(keyword: str, top_k: int = 5):
+def _get_deadline_seconds(runner, deadline_ms):
+    """병합된 요청이 기다릴 최대 시간 (초). runner가 InferenceExecutor.run이면 그 기본 마감 시간 사용"""
+    if deadline_ms is None:
+        deadline_ms = getattr(getattr(runner, "__self__", None), "default_deadline_ms", None)
+    return None if deadline_ms is None else deadline_ms / 1000
+
+def search_vat_law(keyword: str, top_k: int = 5, runner=None, deadline_ms=None, use_cache=True):
     """
     부가가치세법에서 키워드로 관련 조문 검색
     
+    결과 캐시에 있으면 바로 반환하고, 같은 (keyword, top_k) 검색이 이미 진행 중이면
+    새로 계산하지 않고 그 결과를 함께 받는다. 결과의 cache_status는 hit/coalesced/miss/bypass 중 하나다.
+    
     Args:
         keyword: 검색 키워드
         top_k: 반환할 결과 수
+        runner: 실제 계산을 실행할 함수 (예: InferenceExecutor.run). 병합된 요청은 runner를 거치지 않는다
+        deadline_ms: 요청 마감 시간. 없으면 runner의 기본 마감 시간. 병합된 요청도 이 시간까지만 기다린다
+        use_cache: False면 결과 캐시와 요청 병합 없이 항상 새로 계산 (헬스체크용)
     
     Returns:
         검색 결과 딕셔너리
     """
+    if not use_cache:
+        result = _run_search(keyword, top_k, runner, deadline_ms)
+        result["cache_status"] = "bypass"
+        return result
+    
+    key = (keyword, top_k)
+    
+    with _in_flight_lock:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            _result_cache.move_to_end(key)
+            _result_cache_stats["hits"] += 1
+        else:
+            _result_cache_stats["misses"] += 1
+    if cached is not None:
+        result = copy.deepcopy(cached)
+        result["cache_status"] = "hit"
+        return result
+    
+    with _in_flight_lock:
+        in_flight = _in_flight_searches.get(key)
+        is_leader = in_flight is None
+        if is_leader:
+            in_flight = _InFlightSearch()
+            _in_flight_searches[key] = in_flight
+            _single_flight_stats["computations"] += 1
+        else:
+            _single_flight_stats["coalesced"] += 1
+    
+    if not is_leader:
+        if not in_flight.done.wait(_get_deadline_seconds(runner, deadline_ms)):
+            raise DeadlineExceededError(f"병합된 검색 대기 시간 초과: {keyword}")
+        if in_flight.error is not None:
+            raise in_flight.error
+        # 호출자가 결과를 수정해도 서로 영향이 없도록 복사본 반환
+        result = copy.deepcopy(in_flight.result)
+        result["cache_status"] = "coalesced"
+        return result
+    
+    try:
+        in_flight.result = _run_search(keyword, top_k, runner, deadline_ms)
+        
+        # 정상 결과만 캐시에 저장
+        if in_flight.result.get("status") == "success":
+            with _in_flight_lock:
+                _result_cache[key] = in_flight.result
+                while len(_result_cache) > RESULT_CACHE_SIZE:
+                    _result_cache.popitem(last=False)
+        
+        # 캐시에 저장된 결과와 공유하지 않도록 복사본 반환
+        result = copy.deepcopy(in_flight.result)
+        result["cache_status"] = "miss"
+        return result
+    except Exception as run_error:
+        in_flight.error = run_error
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight_searches[key]
+        in_flight.done.set()
+
+def _run_search(keyword: str, top_k: int, runner, deadline_ms):
+    """검색 계산 실행 (runner가 있으면 실행기를 거친다)"""
+    if runner is None:
+        return _search_vat_law(keyword, top_k)
+    # 모델이 아직 없으면 로딩도 실행기 안에서 일어나 마감 시간에 포함된다
+    if deadline_ms is None:
+        return runner(_search_vat_law, keyword, top_k)
+    return runner(_search_vat_law, keyword, top_k, deadline_ms=deadline_ms)
+
+def get_single_flight_statistics():
+    """동일 요청 병합 통계 (coalesced = 절약한 계산 횟수)"""
+    with _in_flight_lock:
+        stats = dict(_single_flight_stats)
+        stats["in_flight"] = len(_in_flight_searches)
+    return stats
+
+def get_result_cache_statistics():
+    """검색 결과 캐시 통계"""
+    with _in_flight_lock:
+        stats = dict(_result_cache_stats)
+        stats["size"] = len(_result_cache)
+        stats["max_size"] = RESULT_CACHE_SIZE
+    return stats
+
+def _search_vat_law(keyword: str, top_k: int):
+    """부가가치세법 검색 실제 계산 (병합 없이)"""
     global search_engine
     
     # 검색 엔진이 초기화되지 않았으면 초기화
@@ -56,6 +225,8 @@ def search_vat_law(keyword: str, top_k: int = 5):
         
         # 벡터 검색 실행
         results = search_engine.search_and_aggregate(keyword, top_k=top_k)
+        if 'error' in results:
+            raise RuntimeError(results['error'])
         
         # 결과 포맷팅
         formatted_results = []
@@ -107,13 +278,46 @@ def get_vat_search_statistics():
         stats = search_engine.get_statistics()
         stats["법령명"] = "부가가치세법"
         stats["설명"] = "부가가치세법 조문 기반 RAG 검색 시스템"
+        stats["중복_요청_병합"] = get_single_flight_statistics()
+        stats["결과_캐시"] = get_result_cache_statistics()
         
         return stats
     except Exception as stats_error:
         print(f"❌ 통계 조회 오류: {stats_error}")
         return {"error": f"통계 조회 실패: {str(stats_error)}"}
 
-def find_related_articles(article_number: str, top_k: int = 3):
+def _get_autocomplete_index():
+    """자동완성 인덱스 (검색 엔진이 이미 있으면 그 인덱스, 없으면 인덱스 파일만 로드)"""
+    global _autocomplete_index
+    
+    if search_engine is not None:
+        return search_engine.autocomplete
+    
+    with _autocomplete_lock:
+        if _autocomplete_index is None:
+            autocomplete_file = get_autocomplete_file(DATA_FILE)
+            if not os.path.exists(autocomplete_file):
+                return None
+            try:
+                _autocomplete_index = AutocompleteIndex.load(autocomplete_file)
+                print(f"✅ 자동완성 인덱스 로딩 완료: {len(_autocomplete_index)}개 항목")
+            except Exception as autocomplete_error:
+                print(f"❌ 자동완성 인덱스 로딩 오류: {autocomplete_error}")
+                return None
+        return _autocomplete_index
+
+def get_autocomplete_suggestions(prefix: str, limit: int = 10):
+    """조문 번호/제목/법률 용어 자동완성 (모델 추론 없음, 검색 엔진 초기화 없음)"""
+    index = _get_autocomplete_index()
+    if index is None:
+        return {"error": "자동완성 인덱스가 없습니다. vat_preprocessor.py를 먼저 실행해주세요."}
+    
+    return {
+        "prefix": prefix,
+        "suggestions": index.suggest(prefix, limit)
+    }
+
+def find_related_articles(article_number: str, top_k: int = 3, runner=None):
     """특정 조문과 관련된 다른 조문들 찾기"""
     global search_engine
     
@@ -126,17 +330,13 @@ def find_related_articles(article_number: str, top_k: int = 3):
     
     try:
         # 해당 조문 찾기
-        target_article = None
-        for chunk in search_engine.data:
-            if chunk['article_number'] == article_number:
-                target_article = chunk
-                break
+        target_article = search_engine.get_article(article_number)
         
         if not target_article:
             return {"error": f"{article_number}를 찾을 수 없습니다"}
         
         # 해당 조문의 내용으로 유사한 조문 검색
-        results = search_vat_law(target_article['full_content'], top_k + 1)
+        results = search_vat_law(target_article['full_content'], top_k + 1, runner=runner)
         
         # 자기 자신 제외
         if 'results' in results:
@@ -148,26 +348,25 @@ def find_related_articles(article_number: str, top_k: int = 3):
         return {
             "base_article": article_number,
             "related_articles": filtered_results[:top_k],
-            "total_found": len(filtered_results)
+            "total_found": len(filtered_results),
+            "cache_status": results.get("cache_status")
         }
         
+    except (QueueFullError, DeadlineExceededError):
+        # 추론 실행기 과부하/마감 초과는 서버가 429/503으로 응답하도록 그대로 전달
+        raise
     except Exception as related_error:
         print(f"❌ 관련 조문 검색 오류: {related_error}")
         print(f"❌ 상세 오류:\n{traceback.format_exc()}")
         return {"error": f"관련 조문 검색 실패: {str(related_error)}"}
 
-# 모듈 import 시 자동으로 초기화 시도
-print("📚 부가가치세법 RAG 모듈 로딩 중...")
-try:
-    initialize_vat_search_engine()
-except Exception as module_error:
-    print(f"❌ 모듈 초기화 중 오류: {module_error}")
-
 if __name__ == "__main__":
     # 직접 실행 시 테스트
     print("\n🧪 부가가치세법 RAG 시스템 테스트")
     print("="*60)
     
+    initialize_vat_search_engine()
+    
     # 통계 정보 출력
     stats = get_vat_search_statistics()
     if "error" not in stats:
@@ -0,0 +1,457 @@
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+import time
+import traceback
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from vat_autocomplete import AutocompleteIndex, get_autocomplete_file
+from vat_vector_search import VATVectorSearch, aggregate_chunks
+
+# 샤드 워커 응답 대기 시간 (초): 시작(샤드 로딩) / 검색 요청
+SHARD_START_TIMEOUT = float(os.environ.get("VAT_SHARD_START_TIMEOUT", 120))
+SHARD_REQUEST_TIMEOUT = float(os.environ.get("VAT_SHARD_REQUEST_TIMEOUT", 30))
+
+def get_shard_manifest_file(data_file: str) -> str:
+    """전처리 데이터 파일에 대응하는 샤드 목록 파일 경로"""
+    base, _ = os.path.splitext(data_file)
+    return f"{base}.shards.json"
+
+def partition_into_shards(processed_data: List[Dict], num_shards: int) -> List[List[Dict]]:
+    """조문 단위로 청크를 N개 샤드에 분배 (청크 수가 가장 적은 샤드에 배정)
+
+    한 조문의 청크는 항상 같은 샤드에 들어가므로 샤드 구성이 입력 순서에 대해 결정적이다.
+    """
+    articles = {}
+    for chunk in processed_data:
+        articles.setdefault((chunk['law_name'], chunk['article_number']), []).append(chunk)
+
+    shards = [[] for _ in range(num_shards)]
+    for chunks in articles.values():
+        target = min(range(num_shards), key=lambda shard_id: (len(shards[shard_id]), shard_id))
+        shards[target].extend(chunks)
+    return shards
+
+def _write_shard_file(shard_file: str, chunks: List[Dict], embeddings: np.ndarray) -> None:
+    """샤드 파일 저장 (메타데이터와 float32 임베딩 행렬을 분리해 빠르게 로딩)"""
+    with open(shard_file, 'wb') as f:
+        pickle.dump({'chunks': chunks, 'embeddings': np.asarray(embeddings, dtype=np.float32)}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+def save_shards(processed_data: List[Dict], data_file: str, num_shards: int) -> str:
+    """전처리 데이터를 N개 샤드 파일로 나눠 저장하고 샤드 목록 파일 경로 반환"""
+    base, _ = os.path.splitext(data_file)
+    shard_files = []
+    for shard_id, chunks in enumerate(partition_into_shards(processed_data, num_shards)):
+        shard_file = f"{base}.shard{shard_id}.pkl"
+        metadata = [{key: value for key, value in chunk.items() if key != 'embedding'} for chunk in chunks]
+        embeddings = np.array([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+        _write_shard_file(shard_file, metadata, embeddings)
+        shard_files.append(os.path.basename(shard_file))
+        print(f"샤드 {shard_id}: {len(chunks)}개 청크 → {shard_file}")
+
+    manifest_file = get_shard_manifest_file(data_file)
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'num_shards': num_shards,
+            'total_chunks': len(processed_data),
+            'shard_files': shard_files
+        }, f, ensure_ascii=False, indent=2)
+    return manifest_file
+
+def _shard_worker(shard_file: str, conn) -> None:
+    """샤드 검색 워커 프로세스: 정규화된 쿼리 행렬을 받아 샤드 내 top-k (유사도, 인덱스, 청크) 반환
+
+    청크 메타데이터(조문 전문 포함)는 워커만 보관하고 코디네이터에는 top-k 결과만 보낸다.
+    """
+    try:
+        with open(shard_file, 'rb') as f:
+            shard = pickle.load(f)
+        chunks = shard['chunks']
+        matrix = shard['embeddings']
+        if matrix.size:
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        del shard
+
+        # 코디네이터용 요약: 청크 수와 조문 목록 (조문은 샤드 하나에만 들어 있음)
+        articles = {}
+        for chunk in chunks:
+            articles.setdefault((chunk['law_name'], chunk['article_number']), {
+                'law_name': chunk['law_name'],
+                'article_number': chunk['article_number'],
+                'article_title': chunk.get('article_title', ''),
+                'embedding_dim': chunk.get('embedding_dim', matrix.shape[1] if matrix.ndim == 2 else 0)
+            })
+        conn.send(('ready', {'chunk_count': len(chunks), 'articles': list(articles.values())}))
+    except Exception as load_error:
+        conn.send(('error', f"{load_error}\n{traceback.format_exc()}"))
+        return
+
+    while True:
+        message = conn.recv()
+        if message[0] == 'stop':
+            break
+
+        if message[0] == 'article':
+            _, law_name, article_number = message
+            conn.send(next((chunk for chunk in chunks
+                            if chunk['article_number'] == article_number and chunk['law_name'] == law_name), None))
+            continue
+
+        _, query_matrix, top_k, similarity_threshold = message
+        if matrix.size == 0:
+            conn.send([[] for _ in range(len(query_matrix))])
+            continue
+
+        similarities = query_matrix @ matrix.T
+        k = min(top_k, matrix.shape[0])
+        results = []
+        for row in similarities:
+            top_indices = np.argpartition(-row, k - 1)[:k]
+            top_indices = top_indices[np.argsort(-row[top_indices])]
+            results.append([(float(row[idx]), int(idx), chunks[idx])
+                            for idx in top_indices if row[idx] >= similarity_threshold])
+        conn.send(results)
+
+    conn.close()
+
+class ShardWorkerError(RuntimeError):
+    """샤드 워커가 중단되어 다시 시작하지 못함"""
+
+class ShardPool:
+    def __init__(self, shard_files: List[str]):
+        """샤드별 검색 워커 프로세스 시작
+
+        각 샤드는 독립 프로세스가 메모리에 올려 두고, 쿼리는 모든 샤드에 동시에 보낸 뒤
+        샤드별 top-k를 합쳐 전체 top-k를 만든다 (scatter-gather).
+        코디네이터는 조문 목록만 들고 있으므로 메모리 사용량이 코퍼스 크기에 비례하지 않는다.
+        """
+        self._context = multiprocessing.get_context('spawn')
+        self._shard_files = list(shard_files)
+        self._connections = [None] * len(shard_files)
+        self._processes = [None] * len(shard_files)
+        self._locks = [threading.Lock() for _ in shard_files]
+        self.restart_count = 0
+
+        for shard_id in range(len(shard_files)):
+            self._start_worker(shard_id)
+
+        # 샤드별 요약 수집 (조문 → 샤드 위치)
+        self.chunk_count = 0
+        self.articles = []
+        self._article_shards = {}
+        for shard_id, shard_file in enumerate(shard_files):
+            try:
+                summary = self._wait_ready(shard_id)
+            except ShardWorkerError:
+                self.close()
+                raise
+            self.chunk_count += summary['chunk_count']
+            for article in summary['articles']:
+                self._article_shards[(article['law_name'], article['article_number'])] = shard_id
+            self.articles.extend(summary['articles'])
+
+        self._fanout = ThreadPoolExecutor(max_workers=len(shard_files), thread_name_prefix="vat-shard")
+
+    @property
+    def num_shards(self) -> int:
+        return len(self._connections)
+
+    def _start_worker(self, shard_id: int) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_shard_worker, args=(self._shard_files[shard_id], child_conn),
+                                        daemon=True)
+        process.start()
+        child_conn.close()
+        self._connections[shard_id] = parent_conn
+        self._processes[shard_id] = process
+
+    def _wait_ready(self, shard_id: int) -> Dict[str, Any]:
+        try:
+            if not self._connections[shard_id].poll(SHARD_START_TIMEOUT):
+                self._processes[shard_id].kill()
+                raise ShardWorkerError(f"샤드 {shard_id} 워커 시작 시간 초과 ({SHARD_START_TIMEOUT:.0f}초, "
+                                       f"{self._shard_files[shard_id]})")
+            status, payload = self._connections[shard_id].recv()
+        except (EOFError, OSError) as recv_error:
+            raise ShardWorkerError(f"샤드 {shard_id} 워커 시작 실패 ({self._shard_files[shard_id]}): {recv_error}")
+        if status != 'ready':
+            raise ShardWorkerError(f"샤드 로딩 실패 ({self._shard_files[shard_id]}): {payload}")
+        return payload
+
+    def _restart_worker_locked(self, shard_id: int) -> None:
+        """중단된 샤드 워커를 다시 시작 (샤드 잠금을 잡은 상태에서 호출)"""
+        print(f"⚠️ 샤드 {shard_id} 워커 중단 감지 (종료 코드 {self._processes[shard_id].exitcode}), 다시 시작합니다")
+        try:
+            self._connections[shard_id].close()
+        except Exception:
+            pass
+        if self._processes[shard_id].is_alive():
+            self._processes[shard_id].kill()
+        self._processes[shard_id].join(timeout=5)
+        self._start_worker(shard_id)
+        self._wait_ready(shard_id)
+        self.restart_count += 1
+        print(f"✅ 샤드 {shard_id} 워커 재시작 완료")
+
+    def _query_shard(self, shard_id: int, message):
+        # 파이프 하나에는 한 번에 한 요청만 (요청/응답 순서 보장)
+        # 워커가 죽어 있으면 한 번 재시작 후 다시 요청하고, 그래도 실패하면 ShardWorkerError
+        # 응답이 없으면(멈춤) 워커를 종료해 늦은 응답이 다음 요청에 섞이지 않게 하고 ShardWorkerError
+        # (종료된 워커는 다음 요청에서 재시작된다)
+        with self._locks[shard_id]:
+            for attempt in range(2):
+                try:
+                    self._connections[shard_id].send(message)
+                    if not self._connections[shard_id].poll(SHARD_REQUEST_TIMEOUT):
+                        self._processes[shard_id].kill()  # 멈춘 워커는 SIGTERM을 처리하지 못할 수 있음
+                        self._processes[shard_id].join(timeout=5)
+                        raise ShardWorkerError(f"샤드 {shard_id} 워커 응답 시간 초과 ({SHARD_REQUEST_TIMEOUT:.0f}초)")
+                    return self._connections[shard_id].recv()
+                except (EOFError, OSError) as pipe_error:
+                    if attempt == 1:
+                        raise ShardWorkerError(f"샤드 {shard_id} 워커 응답 없음: {pipe_error}")
+                    self._restart_worker_locked(shard_id)
+
+    def search(self, query_matrix: np.ndarray, top_k: int,
+               similarity_threshold: float = 0.1) -> List[List[Dict[str, Any]]]:
+        """정규화된 쿼리 행렬의 쿼리별 전체 top-k 청크 목록 (청크마다 similarity 포함)"""
+        message = ('search', np.ascontiguousarray(query_matrix, dtype=np.float32), top_k, similarity_threshold)
+        shard_results = list(self._fanout.map(lambda shard_id: self._query_shard(shard_id, message),
+                                              range(self.num_shards)))
+
+        merged = []
+        for query_index in range(len(query_matrix)):
+            candidates = [
+                (similarity, -shard_id, -local_index, chunk)
+                for shard_id, results in enumerate(shard_results)
+                for similarity, local_index, chunk in results[query_index]
+            ]
+            top = heapq.nlargest(top_k, candidates, key=lambda candidate: candidate[:3])
+            merged.append([dict(chunk, similarity=similarity) for similarity, _, _, chunk in top])
+        return merged
+
+    def get_article(self, law_name: str, article_number: str) -> Optional[Dict[str, Any]]:
+        """조문의 첫 청크 (조문 전문 포함)를 해당 샤드 워커에서 조회"""
+        shard_id = self._article_shards.get((law_name, article_number))
+        if shard_id is None:
+            return None
+        return self._query_shard(shard_id, ('article', law_name, article_number))
+
+    def close(self) -> None:
+        """워커 프로세스 종료"""
+        for conn in self._connections:
+            try:
+                conn.send(('stop',))
+            except Exception:
+                pass
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if hasattr(self, '_fanout'):
+            self._fanout.shutdown(wait=False)
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+class ShardedVATSearch(VATVectorSearch):
+    def __init__(self, model_name: str = "jhgan/ko-sbert-nli", data_file: str = "vat_law_processed.pkl",
+                 model_revision: Optional[str] = None, query_cache_size: int = 1024, preload_model: bool = False):
+        """샤드 분산 부가가치세법 검색 엔진 초기화
+
+        임베딩 행렬과 청크 메타데이터는 샤드 워커 프로세스들이 나눠 들고, 이 프로세스(코디네이터)는
+        쿼리 인코딩, 결과 병합, 조문별 집계만 담당한다. self.data는 조문 목록(조문당 하나, 전문 제외)이다.
+        """
+        self.shard_pool = None
+        super().__init__(model_name, data_file, model_revision, query_cache_size, preload_model)
+
+    def _load_data(self, data_file: str) -> List[Dict]:
+        """샤드 워커 시작 후 조문 목록 수집"""
+        manifest_file = get_shard_manifest_file(data_file)
+        print(f"📂 '{manifest_file}' 로딩 중...")
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            base_dir = os.path.dirname(os.path.abspath(manifest_file))
+            shard_files = [os.path.join(base_dir, name) for name in manifest['shard_files']]
+            self.shard_pool = ShardPool(shard_files)
+            print(f"✅ 샤드 {self.shard_pool.num_shards}개 준비 완료: {self.shard_pool.chunk_count}개 청크")
+            return self.shard_pool.articles
+        except FileNotFoundError:
+            print(f"❌ '{manifest_file}' 파일을 찾을 수 없습니다!")
+            print("   먼저 'python vat_preprocessor.py --shards N'을 실행해주세요.")
+            return []
+        except Exception as load_error:
+            print(f"❌ 샤드 로딩 오류: {load_error}")
+            print(f"❌ 상세 오류:\n{traceback.format_exc()}")
+            return []
+
+    def _create_embeddings_matrix(self) -> np.ndarray:
+        """임베딩 행렬은 샤드 워커가 보관하므로 코디네이터에는 만들지 않음"""
+        return np.array([])
+
+    def _load_autocomplete(self, data_file: str) -> AutocompleteIndex:
+        """자동완성 인덱스 로드 (조문 전문이 코디네이터에 없으므로 전처리 때 저장한 파일만 사용)"""
+        autocomplete_file = get_autocomplete_file(data_file)
+        if not os.path.exists(autocomplete_file):
+            print(f"⚠️ '{autocomplete_file}' 파일이 없어 자동완성을 사용하지 않습니다")
+            return AutocompleteIndex([])
+        return super()._load_autocomplete(data_file)
+
+    @property
+    def num_chunks(self) -> int:
+        return self.shard_pool.chunk_count if self.shard_pool is not None else 0
+
+    def get_article(self, article_number: str, law_name: Optional[str] = None) -> Optional[Dict]:
+        """조문의 첫 청크를 해당 샤드 워커에서 조회"""
+        if law_name is None:
+            law_name = next((article['law_name'] for article in self.data
+                             if article['article_number'] == article_number), None)
+        if law_name is None or self.shard_pool is None:
+            return None
+        return self.shard_pool.get_article(law_name, article_number)
+
+    def _gather_chunks(self, query_matrix: np.ndarray, top_k: int, similarity_threshold: float) -> List[List[Dict]]:
+        return self.shard_pool.search(_normalize_rows(query_matrix), top_k, similarity_threshold)
+
+    def search(self, query: str, top_k: int = 10, similarity_threshold: float = 0.1) -> List[Dict]:
+        """쿼리와 유사한 청크 검색 (모든 샤드에 분산)"""
+        if not self.data or self.shard_pool is None:
+            print("❌ 검색 데이터가 없습니다")
+            return []
+
+        print(f"🔍 '{query}' 검색 중... (샤드 {self.shard_pool.num_shards}개)")
+        try:
+            results = self._gather_chunks(self.encode_query(query), top_k, similarity_threshold)[0]
+            print(f"✅ {len(results)}개 관련 청크 발견")
+            return results
+        except Exception as search_error:
+            # 빈 결과로 숨기지 않고 호출자가 오류로 처리하도록 전달 (샤드 워커 오류 포함)
+            print(f"❌ 검색 오류: {search_error}")
+            print(f"❌ 상세 오류:\n{traceback.format_exc()}")
+            raise
+
+    def search_batch(self, queries: List[str], top_k: int = 10, batch_size: int = 64,
+                     workers: Optional[int] = None, similarity_threshold: float = 0.1) -> List[Dict[str, Any]]:
+        """여러 쿼리를 일괄 검색 후 조문별로 집계 (배치 단위로 샤드에 분산)"""
+        if not queries:
+            return []
+        if not self.data or self.shard_pool is None:
+            return [aggregate_chunks(query, [], top_k) for query in queries]
+
+        query_embeddings = self._encode(queries, batch_size=batch_size)
+        results = []
+        for start in range(0, len(queries), batch_size):
+            chunk_lists = self._gather_chunks(query_embeddings[start:start + batch_size], top_k * 2,
+                                              similarity_threshold)
+            for offset, chunks in enumerate(chunk_lists):
+                results.append(aggregate_chunks(queries[start + offset], chunks, top_k))
+        return results
+
+    def get_statistics(self):
+        """검색 엔진 통계 (샤드 수 포함)"""
+        stats = super().get_statistics()
+        if "error" not in stats and self.shard_pool is not None:
+            stats["샤드_수"] = self.shard_pool.num_shards
+            stats["샤드_워커_재시작"] = self.shard_pool.restart_count
+        return stats
+
+    def close(self) -> None:
+        """샤드 워커 종료"""
+        if self.shard_pool is not None:
+            self.shard_pool.close()
+
+def run_scaling_benchmark(shard_counts: List[int], num_chunks: int = 100000, dim: int = 768,
+                          num_queries: int = 2000, batch_size: int = 32, top_k: int = 20,
+                          clients: int = 4) -> List[Dict[str, Any]]:
+    """합성 임베딩으로 샤드 수별 처리량 측정 (모델 불필요, 로컬 프로세스만 사용)"""
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((num_chunks, dim), dtype=np.float32)
+    queries = _normalize_rows(rng.standard_normal((num_queries, dim), dtype=np.float32))
+    metadata = [{'law_name': 'bench', 'article_number': f"제{i}조"} for i in range(num_chunks)]
+    batches = [queries[start:start + batch_size] for start in range(0, num_queries, batch_size)]
+
+    reports = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for num_shards in shard_counts:
+            shard_files = []
+            for shard_id, indices in enumerate(np.array_split(np.arange(num_chunks), num_shards)):
+                shard_file = os.path.join(temp_dir, f"bench_{num_shards}_{shard_id}.pkl")
+                _write_shard_file(shard_file, [metadata[i] for i in indices], corpus[indices])
+                shard_files.append(shard_file)
+
+            pool = ShardPool(shard_files)
+            try:
+                pool.search(batches[0], top_k, -1.0)  # 워밍업
+                latencies = []
+                started = time.perf_counter()
+
+                def run_batch(batch):
+                    batch_started = time.perf_counter()
+                    pool.search(batch, top_k, -1.0)
+                    latencies.append((time.perf_counter() - batch_started) * 1000)
+
+                with ThreadPoolExecutor(max_workers=clients) as executor:
+                    list(executor.map(run_batch, batches))
+                elapsed = time.perf_counter() - started
+            finally:
+                pool.close()
+
+            latencies.sort()
+            report = {
+                'shards': num_shards,
+                'queries_per_second': round(num_queries / elapsed, 1),
+                'batch_latency_p50_ms': round(latencies[len(latencies) // 2], 2),
+                'batch_latency_p95_ms': round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 2)
+            }
+            reports.append(report)
+            print(f"📊 샤드 {num_shards}개: {report['queries_per_second']} 쿼리/초, "
+                  f"배치 p50 {report['batch_latency_p50_ms']}ms, p95 {report['batch_latency_p95_ms']}ms")
+
+    baseline = reports[0]['queries_per_second'] if reports else 0
+    for report in reports:
+        report['speedup'] = round(report['queries_per_second'] / baseline, 2) if baseline else 0.0
+    return reports
+
+def main():
+    """샤드 분산 검색 실행 / 확장성 벤치마크"""
+    parser = argparse.ArgumentParser(description="부가가치세법 샤드 분산 검색")
+    parser.add_argument("--benchmark", action="store_true", help="합성 데이터로 샤드 수별 처리량 측정")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="벤치마크할 샤드 수 목록")
+    parser.add_argument("--chunks", type=int, default=100000, help="벤치마크 합성 청크 수")
+    parser.add_argument("--dim", type=int, default=768, help="벤치마크 임베딩 차원")
+    parser.add_argument("--queries", type=int, default=2000, help="벤치마크 쿼리 수")
+    parser.add_argument("--batch-size", type=int, default=32, help="벤치마크 쿼리 배치 크기")
+    parser.add_argument("--clients", type=int, default=4, help="벤치마크 동시 클라이언트 수")
+    parser.add_argument("--data", default="vat_law_processed.pkl", help="전처리 데이터 파일 (샤드 목록은 같은 이름의 .shards.json)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        reports = run_scaling_benchmark(args.shards, args.chunks, args.dim, args.queries, args.batch_size,
+                                        clients=args.clients)
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+
+    search_engine = ShardedVATSearch(data_file=args.data)
+    try:
+        for query in ["부가가치세 세율", "사업자 정의", "재화 공급", "납세의무자"]:
+            results = search_engine.search_and_aggregate(query, top_k=3)
+            print(f"\n🔍 '{query}': {results['unique_articles']}개 조문")
+            for i, result in enumerate(results['results'], 1):
+                print(f"{i}. {result['article_number']} {result['article_title']} ({result['max_similarity']:.4f})")
+    finally:
+        search_engine.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+# 서버 시작 경로에서 import되면 안 되는 무거운 모듈 (첫 검색 때 로딩)
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "sklearn"]
+
+# 자식 프로세스 결과 줄 표시
+_RESULT_MARKER = "STARTUP_PROFILE:"
+
+# 기준 스냅샷 비교 허용 범위: 단계별 기준값 x (1 + 비율) + 여유(ms)
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_SLACK_MS = 50.0
+
+def _profile_child(include_search: bool) -> Dict[str, Any]:
+    """새 프로세스에서 서버 시작 단계별 소요 시간 측정"""
+    phases = []
+
+    def measure(name: str, fn):
+        started = time.perf_counter()
+        result = fn()
+        phases.append({"phase": name, "ms": round((time.perf_counter() - started) * 1000, 2)})
+        return result
+
+    # 모듈 출력은 표준에러로 (표준출력은 결과 JSON 전용)
+    with contextlib.redirect_stdout(sys.stderr):
+        measure("import_numpy", lambda: __import__("numpy"))
+        measure("import_vat_rag_service", lambda: __import__("vat_rag_service"))
+        server = measure("import_vat_main_server", lambda: __import__("vat_main_server"))
+        measure("startup_event", server.on_startup)
+        measure("first_sample_queries", server.get_sample_queries)
+        # 전처리 데이터가 없어도 측정이 끝나도록 HTTP 예외 대신 결과 딕셔너리를 반환하는 함수 사용
+        measure("first_autocomplete", lambda: server.get_autocomplete_suggestions("제", limit=10))
+        cold_start_ms = round(sum(phase["ms"] for phase in phases), 2)
+        heavy_loaded_at_startup = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+
+        if include_search:
+            measure("first_search", lambda: server.search_law(server.SearchRequest(keywords="부가가치세 세율")))
+        server.on_shutdown()
+
+    return {
+        "phases": phases,
+        "cold_start_ms": cold_start_ms,
+        "heavy_modules_at_startup": heavy_loaded_at_startup
+    }
+
+def profile_startup(repeat: int = 3, include_search: bool = False, workdir: str = ".") -> Dict[str, Any]:
+    """서버 콜드 스타트를 repeat번 측정하고 단계별 중앙값 반환
+
+    모델 백그라운드 로딩(VAT_MODEL_WARMUP)은 끄고 측정한다. 켜 두면 torch import가
+    측정 구간과 겹쳐 요청을 받기까지의 시간과 시작 경로의 무거운 import 검사가 흔들린다.
+    """
+    runs = []
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get("PYTHONPATH")]))
+    env.setdefault("VAT_QUERY_LOG", "")  # 측정 중에는 검색 로그를 남기지 않음
+    env["VAT_MODEL_WARMUP"] = "0"
+
+    for _ in range(repeat):
+        command = [sys.executable, os.path.abspath(__file__), "--child"]
+        if include_search:
+            command.append("--include-search")
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True,
+                                   encoding="utf-8")
+        result_lines = [line for line in completed.stdout.splitlines() if line.startswith(_RESULT_MARKER)]
+        if completed.returncode != 0 or not result_lines:
+            raise RuntimeError(f"시작 프로파일 측정 실패:\n{completed.stderr[-2000:]}")
+        runs.append(json.loads(result_lines[-1][len(_RESULT_MARKER):]))
+
+    phase_names = [phase["phase"] for phase in runs[0]["phases"]]
+    return {
+        "repeat": repeat,
+        "phases": [
+            {
+                "phase": name,
+                "median_ms": round(statistics.median(
+                    phase["ms"] for run in runs for phase in run["phases"] if phase["phase"] == name
+                ), 2)
+            }
+            for name in phase_names
+        ],
+        "cold_start_ms": round(statistics.median(run["cold_start_ms"] for run in runs), 2),
+        "heavy_modules_at_startup": sorted(set(name for run in runs for name in run["heavy_modules_at_startup"]))
+    }
+
+def check_profile(profile: Dict[str, Any], budget_ms: float) -> List[str]:
+    """시작 시간 예산 / 무거운 모듈 import 회귀 검사 (위반 목록 반환)"""
+    failures = []
+    if profile["cold_start_ms"] > budget_ms:
+        failures.append(f"콜드 스타트 {profile['cold_start_ms']}ms > 예산 {budget_ms}ms")
+    if profile["heavy_modules_at_startup"]:
+        failures.append(f"시작 경로에서 무거운 모듈 import: {', '.join(profile['heavy_modules_at_startup'])}")
+    return failures
+
+def compare_to_baseline(profile: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float = DEFAULT_TOLERANCE, slack_ms: float = DEFAULT_SLACK_MS) -> List[str]:
+    """기준 스냅샷 대비 느려진 단계 목록 (콜드 스타트 합계 포함)"""
+    failures = []
+    baseline_phases = {phase["phase"]: phase["median_ms"] for phase in baseline.get("phases", [])}
+    measured = [(phase["phase"], phase["median_ms"]) for phase in profile["phases"]]
+    measured.append(("cold_start", profile["cold_start_ms"]))
+    baseline_phases["cold_start"] = baseline.get("cold_start_ms")
+
+    for name, value in measured:
+        reference = baseline_phases.get(name)
+        if reference is None:
+            continue
+        limit = reference * (1 + tolerance) + slack_ms
+        if value > limit:
+            failures.append(f"{name}: {value}ms > 기준 {reference}ms (허용 {limit:.1f}ms)")
+    return failures
+
+def load_snapshot(snapshot_file: str) -> Dict[str, Any]:
+    """저장된 시작 프로파일 스냅샷 로드"""
+    with open(snapshot_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    """서버 시작 프로파일 실행"""
+    parser = argparse.ArgumentParser(description="서버 콜드 스타트 단계별 시간 측정")
+    parser.add_argument("--repeat", type=int, default=3, help="측정 반복 횟수 (중앙값 사용)")
+    parser.add_argument("--include-search", action="store_true", help="첫 검색(모델 로딩 포함)까지 측정")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="콜드 스타트 예산(ms). 넘거나 무거운 모듈이 시작 시 import되면 종료 코드 1")
+    parser.add_argument("--snapshot", default=None, help="측정 결과를 JSON으로 저장할 파일")
+    parser.add_argument("--baseline", default=None, help="비교할 기준 스냅샷. 단계가 허용 범위보다 느려지면 종료 코드 1")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="기준 대비 허용 증가 비율")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(_RESULT_MARKER + json.dumps(_profile_child(args.include_search), ensure_ascii=False))
+        return
+
+    profile = profile_startup(args.repeat, args.include_search)
+
+    print("⏱️ 서버 시작 프로파일 (중앙값)")
+    print("-" * 50)
+    for phase in profile["phases"]:
+        print(f"   {phase['phase']:<26} {phase['median_ms']:>10.2f} ms")
+    print("-" * 50)
+    print(f"   {'콜드 스타트 (서빙 가능까지)':<22} {profile['cold_start_ms']:>10.2f} ms")
+    print(f"   시작 시 무거운 모듈: {', '.join(profile['heavy_modules_at_startup']) or '없음'}")
+
+    if args.snapshot:
+        with open(args.snapshot, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, ensure_ascii=False, indent=2)
+        print(f"💾 스냅샷 저장: {args.snapshot}")
+
+    failures = []
+    if args.budget_ms is not None:
+        failures.extend(check_profile(profile, args.budget_ms))
+    if args.baseline:
+        failures.extend(compare_to_baseline(profile, load_snapshot(args.baseline), args.tolerance))
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    if args.budget_ms is not None or args.baseline:
+        print("✅ 시작 시간 회귀 검사 통과")
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,75 @@
 import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any
+from vat_model_registry import get_model, get_model_registry
+from vat_autocomplete import AutocompleteIndex, get_autocomplete_file
+from vat_projection import EmbeddingProjection, get_projection_file
+from typing import List, Dict, Any, Optional
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 class VATVectorSearch:
-    def __init__(self, model_name: str = "jhgan/ko-sbert-nli", data_file: str = "vat_law_processed.pkl"):
-        """부가가치세법 벡터 검색 엔진 초기화"""
+    def __init__(self, model_name: str = "jhgan/ko-sbert-nli", data_file: str = "vat_law_processed.pkl",
+                 model_revision: Optional[str] = None, query_cache_size: int = 1024, preload_model: bool = False):
+        """부가가치세법 벡터 검색 엔진 초기화
+        
+        모델(torch)은 첫 검색 때 로딩한다. 시작 시 바로 올리려면 preload_model=True.
+        """
         print("🚀 부가가치세법 벡터 검색 엔진 초기화 중...")
+        self.model_name = model_name
+        self.model_revision = model_revision
         
-        # 모델 로딩
-        print("⏳ AI 모델 로딩 중...")
-        try:
-            self.model = SentenceTransformer(model_name)
-            print("✅ 모델 로딩 완료!")
-        except Exception as model_error:
-            print(f"❌ 모델 로딩 실패: {model_error}")
-            raise
+        # 쿼리 임베딩 LRU 캐시 (자주 검색되는 쿼리는 모델 추론 생략)
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+        
+        # 모델 로딩 (전역 레지스트리에서 공유)
+        if preload_model:
+            try:
+                get_model(self.model_name, self.model_revision)
+            except Exception as model_error:
+                print(f"❌ 모델 로딩 실패: {model_error}")
+                raise
         
         # 전처리된 데이터 로딩
         self.data = self._load_data(data_file)
         self.embeddings_matrix = self._create_embeddings_matrix()
+        self.projection = self._load_projection(data_file)
+        self._normalized_matrix = None
+        self.autocomplete = self._load_autocomplete(data_file)
         
-        print(f"✅ 검색 엔진 준비 완료: {len(self.data)}개 청크")
+        print(f"✅ 검색 엔진 준비 완료: {self.num_chunks}개 청크")
+    
+    @property
+    def model(self):
+        """공유 모델 레지스트리의 임베딩 모델"""
+        return get_model(self.model_name, self.model_revision)
+    
+    def is_model_loaded(self) -> bool:
+        """임베딩 모델이 레지스트리에 로딩되어 있는지 (로딩을 일으키지 않음)"""
+        return get_model_registry().is_loaded(self.model_name, self.model_revision)
+    
+    @property
+    def num_chunks(self) -> int:
+        """검색 대상 청크 수"""
+        return len(self.data)
+    
+    def get_article(self, article_number: str, law_name: Optional[str] = None) -> Optional[Dict]:
+        """조문의 첫 청크 (조문 전문 포함) 조회"""
+        for chunk in self.data:
+            if chunk['article_number'] == article_number and (law_name is None or chunk['law_name'] == law_name):
+                return chunk
+        return None
     
     def _load_data(self, data_file: str) -> List[Dict]:
         """전처리된 데이터 로드"""
@@ -42,6 +88,44 @@ class VATVectorSearch:
             print(f"❌ 상세 오류:\n{traceback.format_exc()}")
             return []
     
+    def _load_autocomplete(self, data_file: str) -> AutocompleteIndex:
+        """자동완성 인덱스 로드 (없으면 로딩된 데이터로 생성)"""
+        autocomplete_file = get_autocomplete_file(data_file)
+        try:
+            if os.path.exists(autocomplete_file):
+                index = AutocompleteIndex.load(autocomplete_file)
+            else:
+                index = AutocompleteIndex.build(self.data)
+            print(f"✅ 자동완성 인덱스 준비 완료: {len(index)}개 항목")
+            return index
+        except Exception as autocomplete_error:
+            print(f"❌ 자동완성 인덱스 로딩 오류: {autocomplete_error}")
+            return AutocompleteIndex([])
+    
+    def _load_projection(self, data_file: str) -> Optional[EmbeddingProjection]:
+        """차원 축소 투영 로드 (전처리 시 --projection-dim을 쓴 경우에만 존재)"""
+        projection_file = get_projection_file(data_file)
+        if not os.path.exists(projection_file):
+            return None
+        try:
+            projection = EmbeddingProjection.load(projection_file)
+            data_dim = self.data[0]['embedding_dim'] if self.data else projection.output_dim
+            if projection.output_dim != data_dim:
+                print(f"⚠️ 투영 차원({projection.output_dim})과 데이터 차원({data_dim})이 달라 투영을 사용하지 않습니다")
+                return None
+            print(f"✅ 차원 축소 투영 로딩 완료: {projection.input_dim} → {projection.output_dim}")
+            return projection
+        except Exception as projection_error:
+            print(f"❌ 투영 로딩 오류: {projection_error}")
+            return None
+    
+    def _encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """텍스트 벡터화 (차원 축소 투영이 있으면 인덱스와 같은 차원으로 투영)"""
+        embeddings = np.asarray(self.model.encode(texts, batch_size=batch_size, convert_to_tensor=False))
+        if self.projection is not None:
+            embeddings = self.projection.transform(embeddings)
+        return embeddings
+    
     def _create_embeddings_matrix(self) -> np.ndarray:
         """임베딩을 numpy 행렬로 변환"""
         if not self.data:
@@ -58,6 +142,24 @@ class VATVectorSearch:
             print(f"❌ 상세 오류:\n{traceback.format_exc()}")
             return np.array([])
     
+    def encode_query(self, query: str) -> np.ndarray:
+        """쿼리 벡터화 (LRU 캐시 우선)"""
+        with self._query_cache_lock:
+            cached = self._query_cache.get(query)
+            if cached is not None:
+                self._query_cache.move_to_end(query)
+                self.query_cache_hits += 1
+                return cached
+            self.query_cache_misses += 1
+        
+        query_embedding = self._encode([query])
+        
+        with self._query_cache_lock:
+            self._query_cache[query] = query_embedding
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return query_embedding
+    
     def search(self, query: str, top_k: int = 10, similarity_threshold: float = 0.1) -> List[Dict]:
         """쿼리와 유사한 청크 검색"""
         if not self.data or self.embeddings_matrix.size == 0:
@@ -68,78 +170,80 @@ class VATVectorSearch:
         
         try:
             # 쿼리 벡터화
-            query_embedding = self.model.encode([query])
-            
-            # 코사인 유사도 계산
-            similarities = cosine_similarity(query_embedding, self.embeddings_matrix)[0]
+            query_embedding = self.encode_query(query)
             
-            # 유사도 순으로 정렬
-            similar_indices = np.argsort(similarities)[::-1]
+            # 코사인 유사도 계산 (정규화 벡터의 내적)
+            query_vector = query_embedding[0] / max(np.linalg.norm(query_embedding[0]), 1e-12)
+            similarities = self._normalized_embeddings() @ query_vector
             
-            results = []
-            for idx in similar_indices[:top_k]:
-                similarity = similarities[idx]
-                
-                # 임계값 이상인 결과만 포함
-                if similarity >= similarity_threshold:
-                    chunk_data = self.data[idx].copy()
-                    chunk_data['similarity'] = float(similarity)
-                    results.append(chunk_data)
+            results = self._select_chunks(similarities, top_k, similarity_threshold)
             
             print(f"✅ {len(results)}개 관련 청크 발견")
             return results
             
         except Exception as search_error:
+            # 빈 결과로 숨기면 일시적 오류가 정상 결과로 캐시되므로 호출자에게 전달
             print(f"❌ 검색 오류: {search_error}")
             print(f"❌ 상세 오류:\n{traceback.format_exc()}")
+            raise
+    
+    def _select_chunks(self, similarities: np.ndarray, top_k: int, similarity_threshold: float) -> List[Dict]:
+        """유사도 상위 top_k 청크 중 임계값 이상인 것만 선택"""
+        # 유사도 순으로 정렬
+        similar_indices = np.argsort(similarities)[::-1]
+        
+        results = []
+        for idx in similar_indices[:top_k]:
+            similarity = similarities[idx]
+            
+            # 임계값 이상인 결과만 포함
+            if similarity >= similarity_threshold:
+                chunk_data = self.data[idx].copy()
+                chunk_data['similarity'] = float(similarity)
+                results.append(chunk_data)
+        return results
+    
+    def _normalized_embeddings(self) -> np.ndarray:
+        """코사인 유사도 계산용 정규화 임베딩 행렬 (최초 호출 시 한 번 계산)"""
+        if self._normalized_matrix is None:
+            norms = np.linalg.norm(self.embeddings_matrix, axis=1, keepdims=True)
+            self._normalized_matrix = self.embeddings_matrix / np.maximum(norms, 1e-12)
+        return self._normalized_matrix
+    
+    def search_batch(self, queries: List[str], top_k: int = 10, batch_size: int = 64,
+                     workers: Optional[int] = None, similarity_threshold: float = 0.1) -> List[Dict[str, Any]]:
+        """여러 쿼리를 일괄 검색 후 조문별로 집계
+        
+        쿼리는 batch_size 단위로 한 번에 인코딩하고, 유사도 계산과 집계는 workers개 스레드로 나눠 처리한다.
+        (numpy 행렬 곱은 GIL을 풀기 때문에 스레드로도 여러 코어를 사용한다)
+        """
+        if not queries:
             return []
+        if not self.data or self.embeddings_matrix.size == 0:
+            return [aggregate_chunks(query, [], top_k) for query in queries]
+        
+        query_embeddings = self._encode(queries, batch_size=batch_size)
+        query_norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        query_embeddings = query_embeddings / np.maximum(query_norms, 1e-12)
+        matrix = self._normalized_embeddings()
+        
+        def score_block(start: int) -> List[Dict[str, Any]]:
+            block_similarities = query_embeddings[start:start + batch_size] @ matrix.T
+            block_results = []
+            for offset, similarities in enumerate(block_similarities):
+                chunks = self._select_chunks(similarities, top_k * 2, similarity_threshold)
+                block_results.append(aggregate_chunks(queries[start + offset], chunks, top_k))
+            return block_results
+        
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            blocks = executor.map(score_block, range(0, len(queries), batch_size))
+            return [result for block in blocks for result in block]
     
     def search_and_aggregate(self, query: str, top_k: int = 10) -> Dict[str, Any]:
         """검색 후 조문별로 집계"""
         try:
             chunks = self.search(query, top_k * 2)  # 더 많이 검색해서 집계
-            
-            if not chunks:
-                return {
-                    'query': query,
-                    'total_chunks_found': 0,
-                    'unique_articles': 0,
-                    'results': []
-                }
-            
-            # 조문별로 그룹화
-            article_groups = {}
-            for chunk in chunks:
-                article_key = f"{chunk['law_name']}_{chunk['article_number']}"
-                
-                if article_key not in article_groups:
-                    article_groups[article_key] = {
-                        'law_name': chunk['law_name'],
-                        'article_number': chunk['article_number'],
-                        'article_title': chunk['article_title'],
-                        'full_content': chunk['full_content'],
-                        'max_similarity': chunk['similarity'],
-                        'avg_similarity': chunk['similarity'],
-                        'chunk_count': 1,
-                        'relevant_chunks': [chunk['chunk_content']]
-                    }
-                else:
-                    group = article_groups[article_key]
-                    group['max_similarity'] = max(group['max_similarity'], chunk['similarity'])
-                    group['avg_similarity'] = (group['avg_similarity'] * group['chunk_count'] + chunk['similarity']) / (group['chunk_count'] + 1)
-                    group['chunk_count'] += 1
-                    group['relevant_chunks'].append(chunk['chunk_content'])
-            
-            # 최고 유사도 순으로 정렬
-            aggregated_results = list(article_groups.values())
-            aggregated_results.sort(key=lambda x: x['max_similarity'], reverse=True)
-            
-            return {
-                'query': query,
-                'total_chunks_found': len(chunks),
-                'unique_articles': len(aggregated_results),
-                'results': aggregated_results[:top_k]
-            }
+            return aggregate_chunks(query, chunks, top_k)
             
         except Exception as aggregate_error:
             print(f"❌ 집계 오류: {aggregate_error}")
@@ -161,16 +265,67 @@ class VATVectorSearch:
             article_count = len(set(chunk['article_number'] for chunk in self.data))
             
             return {
-                "총_청크수": len(self.data),
+                "총_청크수": self.num_chunks,
                 "총_조문수": article_count,
                 "임베딩_차원": self.data[0]['embedding_dim'] if self.data else 0,
-                "모델명": "jhgan/ko-sbert-nli",
+                "차원_축소": self.projection.get_statistics() if self.projection is not None else None,
+                "모델명": self.model_name,
+                "모델_레지스트리": get_model_registry().get_statistics(),
+                "쿼리_임베딩_캐시": {
+                    "크기": len(self._query_cache),
+                    "적중": self.query_cache_hits,
+                    "미스": self.query_cache_misses
+                },
                 "상태": "준비완료"
             }
         except Exception as stats_error:
             print(f"❌ 통계 조회 오류: {stats_error}")
             return {"error": f"통계 조회 실패: {str(stats_error)}"}
 
+def aggregate_chunks(query: str, chunks: List[Dict], top_k: int) -> Dict[str, Any]:
+    """검색된 청크들을 조문별로 집계"""
+    if not chunks:
+        return {
+            'query': query,
+            'total_chunks_found': 0,
+            'unique_articles': 0,
+            'results': []
+        }
+    
+    # 조문별로 그룹화
+    article_groups = {}
+    for chunk in chunks:
+        article_key = f"{chunk['law_name']}_{chunk['article_number']}"
+        
+        if article_key not in article_groups:
+            article_groups[article_key] = {
+                'law_name': chunk['law_name'],
+                'article_number': chunk['article_number'],
+                'article_title': chunk['article_title'],
+                'full_content': chunk['full_content'],
+                'max_similarity': chunk['similarity'],
+                'avg_similarity': chunk['similarity'],
+                'chunk_count': 1,
+                'relevant_chunks': [chunk['chunk_content']]
+            }
+        else:
+            group = article_groups[article_key]
+            group['max_similarity'] = max(group['max_similarity'], chunk['similarity'])
+            group['avg_similarity'] = (group['avg_similarity'] * group['chunk_count'] + chunk['similarity']) / (group['chunk_count'] + 1)
+            group['chunk_count'] += 1
+            group['relevant_chunks'].append(chunk['chunk_content'])
+    
+    # 최고 유사도 순으로 정렬
+    aggregated_results = list(article_groups.values())
+    aggregated_results.sort(key=lambda x: x['max_similarity'], reverse=True)
+    
+    return {
+        'query': query,
+        'total_chunks_found': len(chunks),
+        'unique_articles': len(aggregated_results),
+        'results': aggregated_results[:top_k]
+    }
+
 def test_search_engine():
     """검색 엔진 테스트"""
     try:
@@ -213,8 +368,87 @@ def test_search_engine():
         print(f"❌ 테스트 오류: {test_error}")
         print(f"❌ 상세 오류:\n{traceback.format_exc()}")
 
+def _read_batch_queries(input_file: str) -> List[Dict[str, Any]]:
+    """일괄 검색 입력 읽기 (한 줄에 검색어 하나, 또는 {"id": ..., "query": ...} JSON)
+    
+    '{'로 시작하지만 JSON이 아닌 줄은 일반 검색어로 보고, query가 없는 JSON 줄은 건너뛴다.
+    """
+    stream = sys.stdin if input_file == '-' else open(input_file, 'r', encoding='utf-8')
+    try:
+        queries = []
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    queries.append({'id': None, 'query': line})
+                    continue
+                query = record.get('query') if isinstance(record, dict) else None
+                if not isinstance(query, str) or not query.strip():
+                    print(f"⚠️ {line_number}번째 줄 건너뜀: 'query' 문자열이 없습니다")
+                    continue
+                queries.append({'id': record.get('id'), 'query': query})
+            else:
+                queries.append({'id': None, 'query': line})
+        return queries
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def run_batch_search(input_file: str, output_file: str, top_k: int = 3, batch_size: int = 64,
+                     workers: Optional[int] = None, block_size: int = 4096):
+    """파일/표준입력의 검색어들을 일괄 검색해 JSONL로 저장 (HTTP 서버 불필요)"""
+    # 결과를 표준출력으로 쓰는 경우 진행 메시지는 표준에러로 보낸다
+    log_stream = sys.stderr if output_file == '-' else sys.stdout
+    
+    with contextlib.redirect_stdout(log_stream):
+        # 모델 로딩 메시지가 결과 JSONL에 섞이지 않도록 여기서 미리 로딩
+        search_engine = VATVectorSearch(preload_model=True)
+        if not search_engine.data:
+            print("❌ 데이터가 없습니다. 먼저 전처리를 실행해주세요.")
+            return
+        
+        queries = _read_batch_queries(input_file)
+        print(f"📥 {len(queries)}개 검색어 일괄 검색 시작 (배치 {batch_size}, 워커 {workers or os.cpu_count()})")
+    
+    started = time.perf_counter()
+    output = sys.stdout if output_file == '-' else open(output_file, 'w', encoding='utf-8')
+    try:
+        # block_size 단위로 검색하고 바로 기록 (메모리 사용량 제한)
+        for block_start in range(0, len(queries), block_size):
+            block = queries[block_start:block_start + block_size]
+            results = search_engine.search_batch([item['query'] for item in block], top_k=top_k,
+                                                 batch_size=batch_size, workers=workers)
+            for item, result in zip(block, results):
+                if item['id'] is not None:
+                    result = {'id': item['id'], **result}
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            print(f"⏳ {min(block_start + block_size, len(queries))}/{len(queries)} 완료", file=log_stream)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    
+    elapsed = time.perf_counter() - started
+    qps = len(queries) / elapsed if elapsed > 0 else 0.0
+    print(f"✅ 일괄 검색 완료: {len(queries)}개 ({elapsed:.2f}초, {qps:.1f} 쿼리/초)", file=log_stream)
+
 def main():
     """메인 실행"""
+    parser = argparse.ArgumentParser(description="부가가치세법 벡터 검색 엔진")
+    parser.add_argument("--batch", metavar="INPUT", help="일괄 검색 입력 파일 ('-'이면 표준입력). 지정하지 않으면 대화형 검색")
+    parser.add_argument("--output", default="vat_batch_results.jsonl", help="일괄 검색 결과 JSONL 파일 ('-'이면 표준출력)")
+    parser.add_argument("--top-k", type=int, default=3, help="검색어당 반환할 조문 수")
+    parser.add_argument("--batch-size", type=int, default=64, help="한 번에 인코딩할 검색어 수")
+    parser.add_argument("--workers", type=int, default=None, help="유사도 계산 워커 수 (기본: CPU 코어 수)")
+    args = parser.parse_args()
+    
+    if args.batch:
+        run_batch_search(args.batch, args.output, args.top_k, args.batch_size, args.workers)
+        return
+    
     print("🧪 부가가치세법 벡터 검색 엔진 테스트")
     print("="*60)
     